@@ -1,7 +1,10 @@
 import numpy as np
-import cplex
-from collections import namedtuple
-import random
+from sparse_model import build_model, fulfil_rule
+from backends import solve
+from solution import Solution
+from symmetry import solve_symmetric
+from instance import random_instance
+import time
 
 
 #-----------------------------------------------------------------------------
@@ -9,30 +12,12 @@ import random
 #-----------------------------------------------------------------------------
 
 
-# List of servers                                   
-Server = namedtuple('Server', ('num',         # Facility number, j
-                               'capacity',    # Computing capacity of the server (in terms of CPU cores), S_{j}
-                               'cost'))       # Unitary cost per cpu, c_{j}
-n = random.randint(5,15)
-Servers = ()
-for i in range(n):
-    Servers += (Server(str(i),random.randint(4,8), random.randint(10,50) ),)
-
-
-# List of clients
-Client = namedtuple('Client', ('num',           # Client number, i
-                               'demand',        # Need of computing power of a part of the algorithm (in terms of CPU cores), d_{i}
-                               'gain',
-                               'tol'))          # Minimum delivery rate desired each client, alpha_{i}
-m = random.randint(2,5)
-Clients = ()
-for i in range(m):
-    Clients += (Client(str(i),random.randint(5,30), random.randint(0,0), random.random()),)
-
-
-# Total unitary transport gain between Client i and Facility j, q_{i,j}
-q = [[-Servers[j].cost*Clients[i].demand for j in range(n)] for i in range(m)]
-q = np.array(q).astype("float")
+# Servers (computing capacity S_{j} in CPU cores, unitary cost per cpu c_{j})
+# and clients (need of computing power d_{i} in CPU cores, minimum delivery
+# rate alpha_{i}) as arrays, see instance.py ; q_{i,j} = -c_{j}*d_{i}
+instance = random_instance("compute")
+n, m = instance.n, instance.m
+Servers, Clients, q = instance.servers, instance.clients, instance.q
 
 
 
@@ -43,84 +28,50 @@ q = np.array(q).astype("float")
 # Build the model
 #-----------------------------------------------------------------------------
 
-def facility_location_problem(Servers, Clients, q) :
+def facility_location_problem(Servers, Clients, q, backend = "cplex", symmetry = None,
+                              deadline = None, gap = None) :
 
-    ## Create CPO model
-    flp = cplex.Cplex()
-    
-    
-    ## Create the decisions variables
-    
-    # Whether or not server j must be used, x_{j}
-    x = list(flp.variables.add(obj = [Servers[j].cost for j in range(n)],
-                               lb = [0]*n,
-                               ub = [1]*n,
-                               types = ["B"]*n))
-    
-    # Rate of client's i demand fullfilled by server j, y_{i,j}
-    y = [[] for i in range(m)]
-    for i in range(m):
-        y[i] = list(flp.variables.add(obj = -q[i],
-                                      lb = [0]*n,
-                                      ub = [1]*n))
+    capacity = Servers.capacity
+    demand = Clients.demand
     
+    ## Identical servers are grouped into types, each with one "number opened"
+    ## variable ("count") or opened in index order ("order")
+    if symmetry is not None :
+        return solve_symmetric(capacity, Servers.cost, demand, -q, "aggregated",
+                               fulfil_rule(demand, capacity), Clients.tol,
+                               mode = symmetry, backend = backend, time_limit = deadline, mip_gap = gap)
+
+    ## Build the model arrays in one pass
+    start = time.time()
+    model = build_model(capacity = capacity,
+                        cost = Servers.cost,
+                        demand = demand,
+                        obj_y = -q,
+                        formulation = "aggregated",
+                        fulfil = fulfil_rule(demand, capacity),
+                        tol = Clients.tol)
     
-    ## Create the constraints
+    build = time.time()
     
-    # Facility j cannot supply more than x_{j}*S_{j}: 
-        
-    flp.linear_constraints.add(lin_expr = [[[y[i][j] for i in range(m)]+[x[j]],[Clients[i].demand for i in range(m)]+[-Servers[j].capacity]] for j in range(n)],
-                               senses = ["L"]*n,
-                               rhs = [0.0]*n
-                               )
+    ## Solve the model with the chosen backend ("cplex" or "highs"), within
+    ## deadline seconds and to the relative gap if given ; backend "anytime"
+    ## answers at once with a rounded solution and improves it until then
     
-        
-    # Demands are fullfiled : if all demands can be fullfilled, they are, and if not then we insure that client's demand are satisfied with a certain tolerance
-    
-    if sum(Clients[i].demand for i in range(m)) <= sum(Servers[j].capacity for j in range(n)): 
-        flp.linear_constraints.add(lin_expr = [[y[i],[1.0]*n] for i in range(m)],
-                                    senses = ["E"]*m,                               
-                                    rhs = [1.0]*m)
-    
-    else :
-        flp.linear_constraints.add(lin_expr = [[y[i],[1.0]*n] for i in range(m)],
-                                senses = ["L"]*m,                               
-                                rhs = [1.0]*m)
-        flp.linear_constraints.add(lin_expr = [[y[i], [1.0]*n] for i in range(m)], 
-                               senses = ["G"]*m,
-                               rhs = [Clients[i].tol for i in range(m)])  
-        
-    ## Solve the model
-    
-    flp.solve()
-    return flp
+    result = solve(model, backend = backend, time_limit = deadline, mip_gap = gap)
+    print("build time:", build-start, "solve time:", result.solve_time)
+    return result
 
 
 #-----------------------------------------------------------------------------
 # Get and print results
 #-----------------------------------------------------------------------------
 
-flp = facility_location_problem(Servers, Clients, q)
-
-x_sol = flp.solution.get_values()[:n]
-y_sol = np.array([flp.solution.get_values()[(i+1)*n:(i+2)*n] for i in range(m)])
-distr = np.array([y_sol[i]*Clients[i].demand for i in range(m)])
-
-
-print(distr)
-
-for j in range(n):
-    if x_sol[j] == 0:
-        a=1
-   #     print("Server " + str(j+1) + " is shutdown")
-    else :
-        print("Server " + str(j) + " uses " + str(100*round(sum(distr[:,j])/Servers[j].capacity,3)) + "% of computing capacity")
-        for i in [i for i in range(m) if y_sol[i,j] > 0.0]:
-            a=2
-            #print("   - Client " + str(i+1) + " which has " + str(100*round(y_sol[i,j], 3)) + "% of its data treated by this server")
-print("\n"
-      + str(100*round(sum(sum(distr))/sum([Servers[j].capacity for j in range(n)]), 3))
-      + "% computing capacity used\n"
-      + str(100*round(sum(sum(distr))/sum([Clients[i].demand for i in range(m)]), 3))
-      + "% data treated"
-      + "\nTotal cost : " + str(round(flp.solution.get_objective_value(),2)))
+result = facility_location_problem(Servers, Clients, q)
+
+sol = Solution.from_result(result, Clients.demand, Servers.capacity)
+
+
+print(sol.distr)
+
+for line in sol.report(closed = False, clients = False) :
+    print(line)
@@ -0,0 +1,72 @@
+import numpy as np
+from collections import namedtuple
+from scipy.sparse import csr_matrix
+
+
+#-----------------------------------------------------------------------------
+# Aggregation of the clients sharing a network node
+#-----------------------------------------------------------------------------
+
+# Clients on the same node have the same unitary cost towards every server,
+# so they can be merged into one client whose demand is the sum of theirs :
+# any split of the merged demand gives each client of the group the same rates
+# y_{i,j}, with the same capacity use and the same cost. Clients are only
+# merged inside a tolerance class ; with tol_step the tolerances are rounded
+# up to classes of that width and the group keeps the largest tolerance of its
+# clients, so that each client still gets at least its own alpha_{i}. The
+# model of the groups is then stricter than the one of the clients : its
+# solution is feasible but not proven optimal (see raised). Without tol_step
+# only equal tolerances are merged, which is exact.
+
+Aggregation = namedtuple('Aggregation', ('group',     # Group of every client
+                                         'node',      # Node of every group
+                                         'demand',    # Total demand of every group
+                                         'tol'))      # Tolerance of every group
+
+
+def aggregate_clients(nodes, demand, tol = None, tol_step = None) :
+
+    nodes = np.asarray(nodes)
+    demand = np.asarray(demand, dtype = float)
+    if tol is None :
+        keys = nodes[:, None]
+    else :
+        tol = np.asarray(tol, dtype = float)
+        tol_class = np.ceil(tol/tol_step) if tol_step else tol
+        keys = np.column_stack((nodes, tol_class))
+
+    _, first, group = np.unique(keys, axis = 0, return_index = True, return_inverse = True)
+    group = group.reshape(-1)
+    g = len(first)
+
+    agg_demand = np.bincount(group, weights = demand, minlength = g)
+    agg_tol = None
+    if tol is not None :
+        agg_tol = np.full(g, -np.inf)
+        np.maximum.at(agg_tol, group, tol)
+    return Aggregation(group, nodes[first], agg_demand, agg_tol)
+
+
+# Whether a group kept a tolerance above the one of some of its clients
+def raised(agg, tol) :
+
+    if tol is None or agg.tol is None :
+        return False
+    return bool(np.any(agg.tol[agg.group] > np.asarray(tol, dtype = float)))
+
+
+# Sum of the rows of every group, e.g. q_{i,j} = unit_{node,j}*d_{i} of the
+# clients gives the q of the groups
+def aggregate_rows(rows, group) :
+
+    m = len(group)
+    G = csr_matrix((np.ones(m), (group, np.arange(m))), shape = (group.max() + 1, m))
+    return np.asarray(G @ rows)
+
+
+# Values of the model of the groups (x then y_{g,j}) back to the layout of the
+# model of the clients : every client gets the rates of its group
+def disaggregate(values, n, group) :
+
+    y = values[n:].reshape(-1, n)
+    return np.concatenate((values[:n], y[group].reshape(-1)))
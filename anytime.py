@@ -0,0 +1,137 @@
+import numpy as np
+import threading
+import time
+
+from backends import Result, solve
+from lagrangian import dense_costs, lagrangian_bound, repair, evaluate
+
+
+#-----------------------------------------------------------------------------
+# Anytime solve
+#-----------------------------------------------------------------------------
+
+# For placement decisions with a latency budget : a feasible answer comes
+# first, then it is improved until the deadline, and the best solution with
+# the best certified lower bound is what is returned (and given to progress
+# every time it improves).
+#   1. greedy  : the servers worth opening for the knapsack of their own
+#                clients, repaired to cover the demand, flows filled greedily
+#                (the primal side of lagrangian.py)
+#   2. LP      : relaxation of the model, its objective is the first bound,
+#                and its x is rounded at 0.5, up, and randomly (x_{j} as the
+#                probability to open j), each repaired then filled greedily
+#   3. MIP     : the exact backend with the time left and the gap target,
+#                started from the best solution (CPLEX only)
+# Stops as soon as the gap target is met.
+#
+# The greedy answer is always computed, so a deadline shorter than the greedy
+# pass is overrun by it : about 0.13 s on 1000 servers x 200 to 300 clients,
+# mostly the greedy flows, growing with n*m. HiGHS (through scipy) does not
+# keep short time limits, so the LP and the MIP run in a thread and are given
+# up at the deadline : the answer is on time, the abandoned solve ends in the
+# background (the interpreter waits for it before exiting, since killing the
+# solver at exit aborts the process).
+
+# fn(*args, **kwargs) if it ends before the time end, otherwise None ; an
+# exception raised by fn before the end is raised again here
+def _before(end, fn, *args, **kwargs) :
+
+    out, error = [], []
+    def run() :
+        try :
+            out.append(fn(*args, **kwargs))
+        except BaseException as e :
+            error.append(e)
+
+    thread = threading.Thread(target = run)
+    thread.start()
+    thread.join(max(0.0, end - time.time()) if np.isfinite(end) else None)
+    if error :
+        raise error[0]
+    return out[0] if out else None
+
+
+def solve_anytime(model, deadline = None, gap = None, backend = "cplex", rounds = 20, seed = None,
+                  progress = None, **options) :
+
+    start = time.time()
+    end = start + (deadline if deadline is not None else np.inf)
+    target = 1e-4 if gap is None else gap
+
+    C, lo = dense_costs(model)
+    cost, demand, capacity = model.obj[:model.n], model.demand, model.capacity
+    C_finite = np.where(np.isfinite(C), C, 1e30)
+
+    best = {"objective": np.inf, "bound": -np.inf, "values": None, "nodes": 0}
+
+    def keep(objective, values = None, bound = None) :
+        improved = False
+        if values is not None and objective < best["objective"] - 1e-9 :
+            best["objective"], best["values"], improved = objective, values, True
+        if bound is not None and bound > best["bound"] + 1e-9 :
+            best["bound"], improved = bound, True
+        if improved and progress is not None :
+            progress(best["objective"] if best["values"] is not None else None,
+                     best["bound"] if np.isfinite(best["bound"]) else None, best["nodes"])
+
+    def try_open(opened) :
+        opened = repair(opened, cost, demand, capacity, lo)
+        objective, y = evaluate(C, cost, demand, capacity, lo, opened)
+        if y is not None :
+            ## opened servers that got no flow are closed again
+            idle = opened & (y.sum(axis = 0) == 0) & (cost >= 0)
+            opened = opened & ~idle
+            keep(objective - cost[idle].sum(), np.concatenate((opened.astype(float), y[model.client, model.server])))
+
+    def done() :
+        if time.time() >= end :
+            return True
+        if best["values"] is None :
+            return False
+        return best["objective"] - best["bound"] <= target*max(1e-10, abs(best["objective"]))
+
+    ## 1. Greedy
+    try_open(lagrangian_bound(np.zeros(model.m), C_finite, cost, demand, capacity, lo)[1])
+
+    ## 2. LP relaxation and rounding
+    if not done() :
+        left = end - time.time()
+        lp = _before(end, solve, model, backend, relax = True, time_limit = left if np.isfinite(left) else None)
+        if lp is not None and lp.status == "optimal" :
+            keep(np.inf, bound = lp.objective)
+            x = lp.values[:model.n]
+            rng = np.random.default_rng(seed)
+            for opened in [x > 0.5, x > 1e-6] + [rng.random(model.n) < x for _ in range(rounds)] :
+                if done() :
+                    break
+                try_open(opened)
+
+    ## 3. Exact MIP with the time left
+    result = None
+    if not done() :
+        left = end - time.time()
+        if backend == "cplex" and best["values"] is not None :
+            options["mip_start"] = best["values"]
+        ## the progress of an abandoned solve is not passed on
+        late = []
+        forward = None if progress is None else lambda *a : None if late else progress(*a)
+        result = _before(end, solve, model, backend, time_limit = left if np.isfinite(left) else None,
+                         mip_gap = gap, progress = forward, **options)
+        if result is None :
+            late.append(True)
+        else :
+            best["nodes"] = result.nodes
+            if result.values is not None :
+                keep(result.objective, result.values, result.bound)
+            elif result.bound is not None :
+                keep(np.inf, bound = result.bound)
+
+    solve_time = time.time() - start
+    if best["values"] is None :
+        return Result("anytime", result.status if result is not None else "limit", None,
+                      best["bound"] if np.isfinite(best["bound"]) else None, None, None, solve_time, best["nodes"])
+    bound = min(best["bound"], best["objective"]) if np.isfinite(best["bound"]) else None
+    optimal = (result is not None and result.status == "optimal" and result.objective <= best["objective"] + 1e-9) \
+              or (bound is not None and best["objective"] - bound <= target*max(1e-10, abs(best["objective"])))
+    return Result("anytime", "optimal" if optimal else "feasible", best["objective"], bound,
+                  best["values"], None, solve_time, best["nodes"])
@@ -0,0 +1,246 @@
+import numpy as np
+from collections import namedtuple
+import time
+
+from sparse_model import load_cplex
+
+
+#-----------------------------------------------------------------------------
+# Solver backends
+#-----------------------------------------------------------------------------
+
+# Every backend takes a sparse_model.Model and returns a Result, so the same
+# instance can be solved with CPLEX or with HiGHS (through scipy) on workers
+# without a CPLEX license. Options understood by every backend :
+#   relax      : solve the LP relaxation and return the row duals
+#   time_limit : in seconds
+#   mip_gap    : relative MIP gap at which to stop
+#   threads    : number of solver threads (ignored by HiGHS)
+#   log        : print the solver log
+#   progress   : called as progress(objective, bound, nodes) during the solve
+#                (objective None before the first incumbent), see solve_trace.py
+#   mip_start  : values of every column of a solution to start from (ignored
+#                by HiGHS)
+
+class Result(namedtuple('Result', ('backend',      # Name of the backend used
+                                   'status',       # "optimal", "feasible", "limit", "infeasible", "unbounded" or "error"
+                                   'objective',    # Objective value of the returned solution
+                                   'bound',        # Best proven lower bound
+                                   'values',       # Values of every column of the model
+                                   'duals',        # Row duals (LP relaxation only)
+                                   'solve_time',   # In seconds
+                                   'nodes'))) :    # Branch-and-bound nodes processed
+
+    # Relative MIP gap, computed the way CPLEX does
+    @property
+    def gap(self) :
+        if self.objective is None or self.bound is None :
+            return None
+        return abs(self.objective - self.bound)/max(1e-10, abs(self.objective))
+
+
+#-----------------------------------------------------------------------------
+# CPLEX
+#-----------------------------------------------------------------------------
+
+# callback : a generic callback object of our own (with a contexts() method
+# giving the contexts it is called in), in place of the one of progress
+def solve_cplex(model, relax = False, time_limit = None, mip_gap = None, threads = None, log = False,
+                progress = None, mip_start = None, callback = None) :
+
+    flp = load_cplex(model)
+    if not log :
+        flp.set_log_stream(None)
+        flp.set_results_stream(None)
+    if time_limit is not None :
+        flp.parameters.timelimit.set(time_limit)
+    if mip_gap is not None :
+        flp.parameters.mip.tolerances.mipgap.set(mip_gap)
+    if threads is not None :
+        flp.parameters.threads.set(threads)
+    if relax :
+        flp.set_problem_type(flp.problem_type.LP)
+    else :
+        if callback is None and progress is not None :
+            callback = ProgressCallback(progress)
+        if callback is not None :
+            flp.set_callback(callback, callback.contexts())
+        if mip_start is not None :
+            import cplex
+            pair = cplex.SparsePair(ind = list(range(len(mip_start))), val = np.asarray(mip_start, dtype = float).tolist())
+            flp.MIP_starts.add(pair, flp.MIP_starts.effort_level.repair)
+
+    start = time.time()
+    flp.solve()
+    solve_time = time.time() - start
+
+    return cplex_result(flp, relax, solve_time)
+
+
+# Generic callback, in the global progress context only : CPLEX calls it
+# between nodes and it only reads a few numbers
+class ProgressCallback :
+
+    def __init__(self, progress) :
+        import cplex
+        self.progress = progress
+        self.info = cplex.callbacks.Context.info
+
+    @staticmethod
+    def contexts() :
+        import cplex
+        return cplex.callbacks.Context.id.global_progress
+
+    def invoke(self, context) :
+        info = self.info
+        objective = context.get_double_info(info.best_solution) if context.get_int_info(info.feasible) else None
+        self.progress(objective, context.get_double_info(info.best_bound), context.get_int_info(info.node_count))
+
+
+# Read back the solution of a solved cplex.Cplex object in a single call
+def cplex_result(flp, relax, solve_time) :
+
+    st = flp.solution.status
+    code = flp.solution.get_status()
+    if code in (st.optimal, st.optimal_tolerance, st.MIP_optimal) :
+        status = "optimal"
+    elif code in (st.infeasible, st.MIP_infeasible) :
+        status = "infeasible"
+    elif code in (st.unbounded, st.MIP_unbounded, st.infeasible_or_unbounded, st.MIP_infeasible_or_unbounded) :
+        status = "unbounded"
+    elif flp.solution.is_primal_feasible() :
+        status = "feasible"
+    else :
+        status = "limit"
+
+    if not flp.solution.is_primal_feasible() :
+        return Result("cplex", status, None, None, None, None, solve_time, 0)
+
+    values = np.array(flp.solution.get_values())
+    objective = flp.solution.get_objective_value()
+    if relax :
+        return Result("cplex", status, objective, objective, values,
+                      np.array(flp.solution.get_dual_values()), solve_time, 0)
+    return Result("cplex", status, objective, flp.solution.MIP.get_best_objective(), values,
+                  None, solve_time, flp.solution.progress.get_num_nodes_processed())
+
+
+#-----------------------------------------------------------------------------
+# HiGHS, through scipy.optimize
+#-----------------------------------------------------------------------------
+
+# scipy gives no access to the HiGHS callbacks : progress is only called once,
+# with the final numbers
+def solve_highs(model, relax = False, time_limit = None, mip_gap = None, threads = None, log = False,
+                progress = None, mip_start = None) :
+    from scipy.optimize import milp, Bounds, LinearConstraint
+
+    options = {"disp": log}
+    if time_limit is not None :
+        options["time_limit"] = time_limit
+
+    start = time.time()
+    if relax :
+        return highs_relaxation(model, options, start)
+
+    if mip_gap is not None :
+        options["mip_rel_gap"] = mip_gap
+    row_lb = np.where(model.senses == "L", -np.inf, model.rhs)
+    row_ub = np.where(model.senses == "G", np.inf, model.rhs)
+    res = milp(model.obj,
+               integrality = np.isin(model.types, ("B", "I")).astype(int),
+               bounds = Bounds(model.lb, model.ub),
+               constraints = LinearConstraint(model.A, row_lb, row_ub),
+               options = options)
+    solve_time = time.time() - start
+
+    status = {0: "optimal", 2: "infeasible", 3: "unbounded"}.get(res.status, "error")
+    if res.status == 1 :
+        status = "feasible" if res.x is not None else "limit"
+    if res.x is None :
+        result = Result("highs", status, None, None, None, None, solve_time, 0)
+    else :
+        bound = getattr(res, "mip_dual_bound", None)
+        result = Result("highs", status, res.fun, res.fun if bound is None else bound, res.x,
+                        None, solve_time, getattr(res, "mip_node_count", 0))
+    if progress is not None :
+        progress(result.objective, result.bound, result.nodes)
+    return result
+
+
+# linprog wants the rows split by sense ; the duals are mapped back to the row
+# order of the model with the CPLEX sign convention (reduced cost = c - A^T*pi)
+def highs_relaxation(model, options, start) :
+    from scipy.optimize import linprog
+
+    le = np.flatnonzero(model.senses == "L")
+    ge = np.flatnonzero(model.senses == "G")
+    eq = np.flatnonzero(model.senses == "E")
+    ub_rows = np.concatenate((le, ge))
+    sign = np.concatenate((np.ones(len(le)), -np.ones(len(ge))))
+
+    A_ub = model.A[ub_rows].multiply(sign[:, None]).tocsr() if len(ub_rows) else None
+    A_eq = model.A[eq] if len(eq) else None
+    res = linprog(model.obj,
+                  A_ub = A_ub, b_ub = model.rhs[ub_rows]*sign if len(ub_rows) else None,
+                  A_eq = A_eq, b_eq = model.rhs[eq] if len(eq) else None,
+                  bounds = np.column_stack((model.lb, model.ub)),
+                  method = "highs",
+                  options = options)
+    solve_time = time.time() - start
+
+    status = {0: "optimal", 1: "limit", 2: "infeasible", 3: "unbounded"}.get(res.status, "error")
+    if res.x is None :
+        return Result("highs", status, None, None, None, None, solve_time, 0)
+    duals = np.zeros(len(model.senses))
+    if len(ub_rows) :
+        duals[ub_rows] = res.ineqlin.marginals*sign
+    if len(eq) :
+        duals[eq] = res.eqlin.marginals
+    return Result("highs", status, res.fun, res.fun, res.x, duals, solve_time, 0)
+
+
+#-----------------------------------------------------------------------------
+# Lagrangian heuristic, for the instances beyond the exact MIP (lagrangian.py)
+#-----------------------------------------------------------------------------
+
+def solve_lagrangian(model, **options) :
+    from lagrangian import solve_lagrangian
+    return solve_lagrangian(model, **options)
+
+
+#-----------------------------------------------------------------------------
+# Anytime solve with a deadline (anytime.py) : time_limit is the deadline,
+# mip_gap the gap target and exact the backend of the LP and the MIP
+#-----------------------------------------------------------------------------
+
+def solve_anytime(model, relax = False, time_limit = None, mip_gap = None, exact = "cplex", **options) :
+    from anytime import solve_anytime
+    if relax :
+        raise ValueError("the anytime solve has no LP relaxation")
+    return solve_anytime(model, deadline = time_limit, gap = mip_gap, backend = exact, **options)
+
+
+#-----------------------------------------------------------------------------
+# Backend selection
+#-----------------------------------------------------------------------------
+
+# Exact dynamic program when q_{i,j} does not depend on the server (server
+# consolidation, see consolidation.py) ; raises ValueError on other models
+def solve_consolidation(model, relax = False, time_limit = None, mip_gap = None, progress = None, **options) :
+    from consolidation import solve_consolidation
+    if relax :
+        raise ValueError("the consolidation solver has no LP relaxation")
+    return solve_consolidation(model, progress = progress)
+
+BACKENDS = {"cplex": solve_cplex,
+            "highs": solve_highs,
+            "lagrangian": solve_lagrangian,
+            "anytime": solve_anytime,
+            "consolidation": solve_consolidation}
+
+
+def solve(model, backend = "cplex", **options) :
+    if backend not in BACKENDS :
+        raise ValueError("unknown backend: " + str(backend) + " (available: " + ", ".join(BACKENDS) + ")")
+    return BACKENDS[backend](model, **options)
@@ -0,0 +1,180 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+
+from instance import VARIANTS, random_instance
+from backends import solve
+from solution import Solution
+
+
+#-----------------------------------------------------------------------------
+# Batch of scenarios
+#-----------------------------------------------------------------------------
+
+# A scenario spec is a dict (or a JSON file) such as
+#   {"variant": ["compute", "network"],
+#    "n": {"low": 50, "high": 200, "step": 50},
+#    "m": [20, 40],
+#    "th": 0.2,
+#    "tol": [null, 0.5, 0.9],
+#    "seeds": 10,
+#    "backend": "highs", "time_limit": 60, "mip_gap": 1e-4}
+# variant, n, m, th and tol take one value, a list or a {"low", "high",
+# "step"} range (high included), seeds a count or a list ; every combination
+# is one task (th is ignored outside "network", and tol for "flp" and
+# "servers", so their values do not multiply the tasks). tol null keeps the random tolerances of the instance, a number
+# gives the same alpha_{i} to every client.
+#
+# Tasks are solved in a process pool, each worker with a fixed budget of
+# solver threads, and every result is appended to a JSON lines file as soon
+# as it completes. A task is identified by its parameters, so a run that
+# stopped can be started again on the same output : the tasks already solved
+# there are skipped (the ones that ended in error are run again).
+
+GRID = ("variant", "n", "m", "th", "tol")
+DEFAULTS = {"th": 0.2, "tol": None}
+
+
+def values(spec) :
+    if isinstance(spec, dict) :
+        low, high, step = spec["low"], spec["high"], spec.get("step", 1)
+        return [low + k*step for k in range(int(round((high - low)/step)) + 1)]
+    if isinstance(spec, (list, tuple)) :
+        return list(spec)
+    return [spec]
+
+
+def task_id(task) :
+    return "-".join(str(k) + "=" + str(task[k]) for k in GRID + ("seed",))
+
+
+def tasks(spec) :
+
+    missing = [k for k in GRID if k not in spec and k not in DEFAULTS]
+    if missing :
+        raise ValueError("missing in the scenario spec: " + ", ".join(missing))
+    grid = {k: values(spec.get(k, DEFAULTS.get(k))) for k in GRID}
+    seeds = spec.get("seeds", 1)
+    seeds = list(range(seeds)) if isinstance(seeds, int) else list(seeds)
+    seen = set()
+    for combination in itertools.product(*(grid[k] for k in GRID), seeds) :
+        task = dict(zip(GRID + ("seed",), combination))
+        if task["variant"] not in VARIANTS :
+            raise ValueError("unknown variant: " + str(task["variant"]))
+        # th only matters for the network variant, tol only for the variants
+        # whose fulfilment rows can use it : the other values give the same task
+        if task["variant"] != "network" :
+            task["th"] = None
+        if VARIANTS[task["variant"]]["fulfil"] != "rule" :
+            task["tol"] = None
+        task["id"] = task_id(task)
+        if task["id"] in seen :
+            continue
+        seen.add(task["id"])
+        yield task
+
+
+#-----------------------------------------------------------------------------
+# Workers
+#-----------------------------------------------------------------------------
+
+# Every worker keeps to its thread budget : the solver gets it as its threads
+# option, and the linear algebra libraries NumPy / SciPy are built with read
+# it from the environment the worker is spawned with
+THREAD_VARIABLES = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+def run_task(task, backend = "highs", threads = 1, time_limit = None, mip_gap = None) :
+
+    record = dict(task)
+    start = time.time()
+    try :
+        instance = random_instance(task["variant"], int(task["n"]), int(task["m"]), seed = task["seed"],
+                                   th = 0.2 if task["th"] is None else task["th"])
+        if task["tol"] is not None :
+            instance.tol[:] = task["tol"]
+        result = solve(instance.model(), backend, time_limit = time_limit, mip_gap = mip_gap, threads = threads)
+        record.update(status = result.status, objective = result.objective, bound = result.bound,
+                      gap = result.gap, solve_time = result.solve_time, nodes = result.nodes)
+        if result.values is not None :
+            sol = Solution.from_result(result, instance.demand, instance.capacity)
+            record.update(opened = int(sol.opened.sum()), capacity_used = float(sol.capacity_used),
+                          demand_treated = float(sol.demand_treated))
+    except Exception as e :
+        record.update(status = "error", error = repr(e))
+    record["time"] = time.time() - start
+    return record
+
+
+#-----------------------------------------------------------------------------
+# Runner
+#-----------------------------------------------------------------------------
+
+def done_tasks(path) :
+    done = set()
+    if os.path.exists(path) :
+        with open(path) as f :
+            for line in f :
+                try :
+                    record = json.loads(line)
+                except ValueError :
+                    # last line cut by a crash
+                    continue
+                if record.get("status") != "error" :
+                    done.add(record["id"])
+    return done
+
+
+# Solves every task of the spec that is not already in output ; workers
+# defaults to the number of cores divided by the thread budget. Returns the
+# number of tasks run.
+def run_batch(spec, output, workers = None, threads = 1, log = True) :
+
+    done = done_tasks(output)
+    todo = [t for t in tasks(spec) if t["id"] not in done]
+    workers = workers or max(1, (os.cpu_count() or 1)//threads)
+    options = {k: spec[k] for k in ("backend", "time_limit", "mip_gap") if k in spec}
+    if log :
+        print(len(todo), "tasks to run on", workers, "workers with", threads, "threads each")
+
+    saved = {name: os.environ.get(name) for name in THREAD_VARIABLES}
+    os.environ.update({name: str(threads) for name in THREAD_VARIABLES})
+    try :
+        with ProcessPoolExecutor(max_workers = workers, mp_context = multiprocessing.get_context("spawn")) as pool, \
+             open(output, "a") as f :
+            futures = [pool.submit(run_task, t, threads = threads, **options) for t in todo]
+            for k, future in enumerate(as_completed(futures)) :
+                record = future.result()
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                if log :
+                    print(k + 1, "/", len(todo), record["id"], record["status"], record.get("objective"))
+    finally :
+        for name, value in saved.items() :
+            if value is None :
+                os.environ.pop(name, None)
+            else :
+                os.environ[name] = value
+    return len(todo)
+
+
+def main(argv = None) :
+
+    parser = argparse.ArgumentParser(description = "Solve a batch of random scenarios in parallel")
+    parser.add_argument("spec", help = "JSON scenario spec (file)")
+    parser.add_argument("--output", default = "batch_results.jsonl")
+    parser.add_argument("--workers", type = int, default = None)
+    parser.add_argument("--threads", type = int, default = 1, help = "solver threads per worker")
+    args = parser.parse_args(argv)
+
+    with open(args.spec) as f :
+        spec = json.load(f)
+    run_batch(spec, args.output, args.workers, args.threads)
+
+
+if __name__ == "__main__" :
+    main()
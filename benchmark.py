@@ -0,0 +1,207 @@
+import numpy as np
+import argparse
+import csv
+import itertools
+import json
+import os
+import subprocess
+import time
+import tracemalloc
+
+from instance import VARIANTS, random_instance
+from backends import solve
+from solution import Solution
+
+try :
+    import resource
+except ImportError :
+    resource = None
+
+
+#-----------------------------------------------------------------------------
+# Benchmark of the model variants
+#-----------------------------------------------------------------------------
+
+# Every case is one seeded instance of a variant (see instance.VARIANTS),
+# timed phase by phase :
+#   generate  : drawing the instance (without the shortest paths)
+#   distances : shortest paths from the clients' nodes ("network" only)
+#   build     : sparse model
+#   solve     : backend
+#   extract   : Solution and its per server / per client arrays
+# Every record also holds the peak memory of the case (Python allocations,
+# NumPy arrays included, measured in a separate traced run), the max RSS of the process so far, the objective,
+# the bound, the MIP gap and the version of the code, and is appended to a
+# JSON lines history.
+
+FIELDS = ("version", "date", "variant", "n", "m", "th", "seed", "backend",
+          "generate", "distances", "build", "solve", "extract", "total",
+          "peak_mb", "maxrss_mb", "status", "objective", "bound", "gap", "nodes")
+
+
+def version() :
+    try :
+        out = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output = True, text = True,
+                             cwd = os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or "unknown"
+    except OSError :
+        return "unknown"
+
+
+def max_rss_mb() :
+    if resource is None :
+        return None
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+
+
+def _phases(variant, n, m, th, seed, backend, time_limit, mip_gap, cache) :
+
+    record = {}
+    timings = {"distances": 0.0}
+    start = time.time()
+    instance = random_instance(variant, n, m, seed = seed, th = th, cache = cache, timings = timings)
+    record["distances"] = timings["distances"]
+    record["generate"] = time.time() - start - timings["distances"]
+
+    start = time.time()
+    model = instance.model()
+    record["build"] = time.time() - start
+
+    start = time.time()
+    result = solve(model, backend, time_limit = time_limit, mip_gap = mip_gap)
+    record["solve"] = time.time() - start
+
+    start = time.time()
+    if result.values is not None :
+        sol = Solution.from_result(result, instance.demand, instance.capacity)
+        sol.distr, sol.utilization, sol.coverage
+    record["extract"] = time.time() - start
+    return record, result
+
+
+# The phases are timed in a run without tracing ; with memory, the case is
+# run a second time under tracemalloc for the peak memory, since tracing
+# slows down every allocation
+def run_case(variant, n, m, th = 0.2, seed = 0, backend = "highs", time_limit = None, mip_gap = None, cache = None,
+             memory = True) :
+
+    record = {"version": version(), "date": time.strftime("%Y-%m-%d %H:%M:%S"), "variant": variant,
+              "n": n, "m": m, "th": th if variant == "network" else None, "seed": seed, "backend": backend}
+    timings, result = _phases(variant, n, m, th, seed, backend, time_limit, mip_gap, cache)
+    record.update(timings)
+    record["total"] = sum(record[k] for k in ("generate", "distances", "build", "solve", "extract"))
+    record["maxrss_mb"] = max_rss_mb()
+
+    record["peak_mb"] = None
+    if memory :
+        tracemalloc.start()
+        try :
+            _phases(variant, n, m, th, seed, backend, time_limit, mip_gap, cache)
+            record["peak_mb"] = tracemalloc.get_traced_memory()[1]/2**20
+        finally :
+            tracemalloc.stop()
+
+    record.update(status = result.status, objective = result.objective, bound = result.bound,
+                  gap = result.gap, nodes = result.nodes)
+    return record
+
+
+def grid(variants, sizes_n, sizes_m, densities, seeds) :
+    for variant, n, m, seed in itertools.product(variants, sizes_n, sizes_m, seeds) :
+        # the density only matters for the network variant
+        for th in (densities if variant == "network" else densities[:1]) :
+            yield variant, n, m, th, seed
+
+
+#-----------------------------------------------------------------------------
+# History
+#-----------------------------------------------------------------------------
+
+def append_history(records, path) :
+    with open(path, "a") as f :
+        for r in records :
+            f.write(json.dumps(r) + "\n")
+
+
+def read_history(path) :
+    if not os.path.exists(path) :
+        return []
+    with open(path) as f :
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_csv(records, path) :
+    with open(path, "w", newline = "") as f :
+        writer = csv.DictWriter(f, fieldnames = FIELDS, extrasaction = "ignore")
+        writer.writeheader()
+        writer.writerows(records)
+
+
+# Cases of version new that are slower (total time) than in version old by
+# more than a factor threshold, or whose objective changed
+def regressions(history, old, new, threshold = 1.5) :
+
+    def key(r) :
+        return (r["variant"], r["n"], r["m"], r["th"], r["seed"], r["backend"])
+
+    before = {key(r): r for r in history if r["version"] == old}
+    out = []
+    for r in history :
+        if r["version"] != new or key(r) not in before :
+            continue
+        b = before[key(r)]
+        slower = r["total"] > threshold*max(b["total"], 1e-3)
+        changed = (r["objective"] is not None and b["objective"] is not None and
+                   not np.isclose(r["objective"], b["objective"], rtol = 1e-6, atol = 1e-6))
+        if slower or changed :
+            out.append((key(r), b["total"], r["total"], b["objective"], r["objective"]))
+    return out
+
+
+#-----------------------------------------------------------------------------
+# Command line
+#-----------------------------------------------------------------------------
+
+def main(argv = None) :
+
+    parser = argparse.ArgumentParser(description = "Benchmark of the facility location variants")
+    parser.add_argument("--variants", nargs = "+", default = list(VARIANTS), choices = list(VARIANTS))
+    parser.add_argument("--n", nargs = "+", type = int, default = [10, 50])
+    parser.add_argument("--m", nargs = "+", type = int, default = [10, 30])
+    parser.add_argument("--th", nargs = "+", type = float, default = [0.2, 0.8])
+    parser.add_argument("--seeds", nargs = "+", type = int, default = [0, 1, 2])
+    parser.add_argument("--backend", default = "highs")
+    parser.add_argument("--time-limit", type = float, default = None)
+    parser.add_argument("--mip-gap", type = float, default = None)
+    parser.add_argument("--history", default = "benchmark_history.jsonl")
+    parser.add_argument("--csv", default = None, help = "also write the records of this run as CSV")
+    parser.add_argument("--compare", nargs = 2, metavar = ("OLD", "NEW"), default = None,
+                        help = "only compare two versions of the history")
+    parser.add_argument("--threshold", type = float, default = 1.5)
+    parser.add_argument("--no-memory", action = "store_true", help = "skip the traced run for the peak memory")
+    args = parser.parse_args(argv)
+
+    if args.compare is not None :
+        found = regressions(read_history(args.history), *args.compare, threshold = args.threshold)
+        for case, t_old, t_new, obj_old, obj_new in found :
+            print(case, "time", round(t_old, 4), "->", round(t_new, 4), "objective", obj_old, "->", obj_new)
+        print(len(found), "regressions")
+        return len(found) > 0
+
+    records = []
+    for variant, n, m, th, seed in grid(args.variants, args.n, args.m, args.th, args.seeds) :
+        record = run_case(variant, n, m, th, seed, args.backend, args.time_limit, args.mip_gap,
+                          memory = not args.no_memory)
+        append_history([record], args.history)
+        records.append(record)
+        print(variant, "n", n, "m", m, "th", record["th"], "seed", seed, record["status"],
+              "build", round(record["build"], 4), "solve", round(record["solve"], 4),
+              "peak", record["peak_mb"] and round(record["peak_mb"], 2), "MB", "gap", record["gap"])
+
+    if args.csv is not None :
+        write_csv(records, args.csv)
+
+
+if __name__ == "__main__" :
+    raise SystemExit(main())
@@ -0,0 +1,188 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from scipy.sparse import csr_matrix, hstack
+import time
+
+from backends import Result, solve
+
+
+#-----------------------------------------------------------------------------
+# Benders decomposition
+#-----------------------------------------------------------------------------
+
+# The master keeps the n binary x_{j} and one variable theta for the cost of
+# the flows ; once x is fixed, what is left is an LP in y (the subproblem) :
+#   min  c_y*y   s.t.  A_y*y (sense) rhs - A_x*x,   0 <= y <= 1
+# Its duals pi give the optimality cut, valid for every x :
+#   theta >= pi*(rhs - A_x*x) + sum_k min(0, c_k - (A_y^T*pi)_k)*ub_k
+# When the subproblem is infeasible, the duals of its phase 1 (slacks on every
+# row) give the feasibility cut pi*(rhs - A_x*x) + sum_k min(0, -(A_y^T*pi)_k)*ub_k <= 0
+# Each iteration the master optimum and a few neighbouring open patterns are
+# evaluated in parallel, every one of them giving a cut and an upper bound.
+
+
+# Subproblem data shared by the worker processes
+_worker = {}
+
+def _init_worker(model, backend) :
+    _worker["model"] = model
+    _worker["backend"] = backend
+
+
+def subproblem(model, x) :
+
+    n = model.n
+    A_x, A_y = model.A[:, :n], model.A[:, n:].tocsr()
+    return model._replace(n = 0, obj = model.obj[n:], lb = model.lb[n:], ub = model.ub[n:],
+                          types = model.types[n:], A = A_y, rhs = model.rhs - A_x @ x), A_x
+
+
+# Phase 1 of the subproblem : one slack per row (two for equality rows) with
+# cost 1, the y columns cost nothing
+def phase_one(sub) :
+
+    r = len(sub.senses)
+    sign = np.where(sub.senses == "L", -1.0, 1.0)
+    eq = np.flatnonzero(sub.senses == "E")
+    S = hstack((csr_matrix((sign, (np.arange(r), np.arange(r))), shape = (r, r)),
+                csr_matrix((-np.ones(len(eq)), (eq, np.arange(len(eq)))), shape = (r, len(eq)))))
+    k = r + len(eq)
+    return sub._replace(obj = np.concatenate((np.zeros(len(sub.obj)), np.ones(k))),
+                        lb = np.concatenate((sub.lb, np.zeros(k))),
+                        ub = np.concatenate((sub.ub, np.full(k, np.inf))),
+                        types = np.concatenate((sub.types, np.full(k, "C"))),
+                        A = hstack((sub.A, S)).tocsr())
+
+
+# Cut of the subproblem of x : ("opt" or "feas", coefficients of x, constant,
+# value of the flows or None, y) ; the cut reads  theta >= const - coef*x  for
+# optimality cuts and  0 >= const - coef*x  for feasibility cuts
+def evaluate(x, model = None, backend = None) :
+
+    model = _worker["model"] if model is None else model
+    backend = _worker["backend"] if backend is None else backend
+
+    sub, A_x = subproblem(model, x)
+    lp = solve(sub, backend, relax = True)
+    if lp.duals is not None and lp.status == "optimal" :
+        rc = sub.obj - sub.A.T @ lp.duals
+        const = lp.duals @ model.rhs + np.minimum(rc, 0) @ sub.ub
+        return "opt", A_x.T @ lp.duals, const, lp.objective, lp.values
+
+    lp = solve(phase_one(sub), backend, relax = True)
+    rc = -(sub.A.T @ lp.duals)
+    const = lp.duals @ model.rhs + np.minimum(rc, 0) @ sub.ub
+    return "feas", A_x.T @ lp.duals, const, None, None
+
+
+#-----------------------------------------------------------------------------
+# Master
+#-----------------------------------------------------------------------------
+
+# Columns x_{j} then theta ; the first row asks the opened capacity to cover
+# the demand that has to be served, then come the cuts
+def master_model(model, cuts) :
+
+    n = model.n
+    lo = {"L": np.zeros(model.m), "E": np.ones(model.m)}.get(model.fulfil)
+    lo = np.asarray(model.tol, dtype = float) if lo is None else lo
+
+    best_y = np.zeros(model.m)
+    np.minimum.at(best_y, model.client, model.obj[n:])
+    theta_lb = best_y.sum()
+
+    rows = [np.append(model.capacity, 0.0)]
+    rhs = [model.demand @ lo]
+    for kind, coef, const in cuts :
+        rows.append(np.append(coef, 1.0 if kind == "opt" else 0.0))
+        rhs.append(const)
+
+    return model._replace(m = 0, obj = np.append(model.obj[:n], 1.0),
+                          lb = np.append(model.lb[:n], theta_lb),
+                          ub = np.append(model.ub[:n], np.inf),
+                          types = np.append(model.types[:n], "C"),
+                          A = csr_matrix(np.array(rows)),
+                          senses = np.full(len(rows), "G"),
+                          rhs = np.array(rhs),
+                          client = np.zeros(0, dtype = int), server = np.zeros(0, dtype = int))
+
+
+# Open patterns next to x : open the closed servers and close the open ones,
+# best capacity per unit of cost first
+def neighbours(x, model, k) :
+
+    rank = np.argsort(model.obj[:model.n]/np.maximum(model.capacity, 1e-12))
+    closed = [j for j in rank if x[j] < 0.5]
+    opened = [j for j in rank[::-1] if x[j] > 0.5]
+    flips = [j for pair in zip(closed, opened) for j in pair] + closed[len(opened):] + opened[len(closed):]
+    out = []
+    for j in flips[:k] :
+        y = x.copy()
+        y[j] = 1 - y[j]
+        out.append(y)
+    return out
+
+
+#-----------------------------------------------------------------------------
+# Solver
+#-----------------------------------------------------------------------------
+
+# Returns the Result (values in the layout of the model) and the history of
+# the bounds, one dict per iteration
+def solve_benders(model, backend = "highs", workers = None, candidates = 4, max_iterations = 200,
+                  mip_gap = 1e-4, time_limit = None, log = False) :
+
+    start = time.time()
+    deadline = start + (time_limit if time_limit is not None else np.inf)
+    mip_gap = 1e-4 if mip_gap is None else mip_gap
+    cost = model.obj[:model.n]
+
+    cuts, history, seen = [], [], set()
+    lower, upper = -np.inf, np.inf
+    best_x, best_y = None, None
+
+    pool = None
+    if workers is None or workers > 1 :
+        pool = ProcessPoolExecutor(max_workers = workers, initializer = _init_worker,
+                                   initargs = (model, backend))
+    try :
+        for it in range(max_iterations) :
+
+            ## Master
+            master = solve(master_model(model, cuts), backend)
+            if master.values is None :
+                break
+            lower = max(lower, master.bound)
+            x = np.round(master.values[:model.n])
+
+            ## Subproblems of the master optimum and of its neighbours
+            patterns = [p for p in [x] + neighbours(x, model, candidates - 1) if p.tobytes() not in seen]
+            seen.update(p.tobytes() for p in patterns)
+            if pool is None :
+                outcomes = [evaluate(p, model, backend) for p in patterns]
+            else :
+                outcomes = list(pool.map(evaluate, patterns))
+
+            for p, (kind, coef, const, flow, y) in zip(patterns, outcomes) :
+                cuts.append((kind, coef, const))
+                if flow is not None and cost @ p + flow < upper :
+                    upper, best_x, best_y = cost @ p + flow, p, y
+
+            gap = abs(upper - lower)/max(1e-10, abs(upper)) if upper < np.inf else np.inf
+            history.append({"iteration": it, "lower": float(lower), "upper": float(upper), "gap": float(gap),
+                            "cuts": len(cuts), "time": time.time() - start})
+            if log :
+                print("iteration", it, "lower", lower, "upper", upper, "gap", gap, "cuts", len(cuts))
+            if gap <= mip_gap or time.time() >= deadline or not patterns :
+                break
+    finally :
+        if pool is not None :
+            pool.shutdown()
+
+    solve_time = time.time() - start
+    if best_x is None :
+        return Result("benders", "infeasible" if master.values is None else "limit",
+                      None, lower, None, None, solve_time, len(history)), history
+    gap = abs(upper - lower)/max(1e-10, abs(upper))
+    return Result("benders", "optimal" if gap <= mip_gap else "feasible", upper, min(lower, upper),
+                  np.concatenate((best_x, best_y)), None, solve_time, len(history)), history
@@ -0,0 +1,130 @@
+import numpy as np
+
+from sparse_model import build_model, dense_values
+from backends import solve
+
+
+#-----------------------------------------------------------------------------
+# Candidate servers of every client
+#-----------------------------------------------------------------------------
+
+# Only the k cheapest servers of each client (by obj_y = q_{i,j}) and / or the
+# servers within `radius` of its node get a y_{i,j} column
+def candidate_mask(obj_y, k = None, radius = None, dist = None) :
+
+    obj_y = np.asarray(obj_y, dtype = float)
+    m, n = obj_y.shape
+    if k is None and radius is None :
+        return np.ones((m, n), dtype = bool)
+
+    mask = np.zeros((m, n), dtype = bool)
+    if k is not None :
+        k = min(k, n)
+        nearest = np.argpartition(obj_y, k - 1, axis = 1)[:, :k]
+        mask[np.arange(m)[:, None], nearest] = True
+    if radius is not None :
+        mask |= np.asarray(dist) <= radius
+
+    # Every client keeps at least its cheapest server
+    mask[np.arange(m), np.argmin(obj_y, axis = 1)] = True
+    return mask
+
+
+#-----------------------------------------------------------------------------
+# Solve with pruned columns priced back in
+#-----------------------------------------------------------------------------
+
+# Reduced cost of every (i, j) pair for the row duals of a relaxation :
+#   obj_{i,j} - d_{i}*pi_cap_{j} - sigma_{i} (- tau_{i} for the tolerance rows)
+# the linking row of a pair that is not in the model yet has no dual
+def reduced_costs(model, obj_y, duals) :
+
+    n, m = model.n, model.m
+    rc = obj_y - model.demand[:, None]*duals[None, :n] - duals[n:n + m, None]
+    if model.fulfil == "tol" :
+        rc -= duals[n + m:n + 2*m, None]
+    return rc
+
+
+# The restricted model is solved and the pruned pairs with a negative reduced
+# cost are added back, until none is left :
+#   1. at the root, with the duals of the LP relaxation, so that the LP bound
+#      is the one of the full model ;
+#   2. after the MIP, with the duals of the LP where x is fixed to its MIP
+#      value, so that the flows are optimal for the servers that are opened ;
+#   3. when the MIP objective is not within mip_gap of the root LP bound, the
+#      open set is not proven optimal for the full model. With the root duals,
+#      any solution opening j costs at least bound + rc_{j} (rc_{j} the reduced
+#      cost of x_{j}), so the servers with bound + rc_{j} above the incumbent
+#      stay closed, and every pair of the other servers is added back. The MIP
+#      of that model (exact for the full one) is solved once more.
+# Returns the result, with values laid out as for the full model and status
+# "optimal" only when the gap to a bound valid for the full model is closed,
+# and the final mask.
+def solve_pruned(capacity, cost, demand, obj_y, mask, formulation = "weak", fulfil = "L",
+                 tol = None, backend = "cplex", eps = 1e-9, **options) :
+
+    obj_y = np.asarray(obj_y, dtype = float)
+    mask = np.array(mask, dtype = bool)
+
+    def build() :
+        return build_model(capacity, cost, demand, obj_y, formulation, fulfil, tol, mask)
+
+    def price(model, duals, allowed) :
+        rc = reduced_costs(model, obj_y, duals)
+        enter = (rc < -eps) & ~mask & allowed
+        mask[enter] = True
+        return enter.any()
+
+    ## 1. Root pricing ; while the restricted model is infeasible (tolerances
+    ## that the candidates cannot reach) each client gets twice as many servers
+    open_all = np.ones_like(mask)
+    while True :
+        model = build()
+        lp = solve(model, backend, relax = True, **options)
+        if lp.status == "infeasible" and not mask.all() :
+            mask |= candidate_mask(obj_y, k = 2*mask.sum(axis = 1).max())
+            continue
+        if lp.duals is None or not price(model, lp.duals, open_all) :
+            break
+    root, root_model, bound = lp, model, lp.objective
+
+    ## 2. MIP, then pricing with the servers fixed
+    while True :
+        result = solve(model, backend, **options)
+        if result.values is None :
+            return result, mask
+        x = np.round(result.values[:model.n])
+        lb, ub = model.lb.copy(), model.ub.copy()
+        lb[:model.n] = ub[:model.n] = x
+        lp = solve(model._replace(lb = lb, ub = ub), backend, relax = True, **options)
+        if lp.duals is None or not price(model, lp.duals, (x > 0.5)[None, :]) :
+            break
+        model = build()
+
+    ## 3. Exactness : reduced cost fixing of x with the root duals, then the
+    ## MIP with every pair of the servers that can still be opened
+    target = options.get("mip_gap") or 1e-4
+    values = dense_values(model, result.values)
+    if result.objective - bound > target*max(1e-10, abs(result.objective)) and root.duals is not None :
+        rc = root_model.obj[:root_model.n] - root_model.A[:, :root_model.n].T @ root.duals
+        closed = bound + rc > result.objective + eps
+        mask |= ~closed[None, :] & np.isfinite(obj_y)
+        model = build()
+        ub = model.ub.copy()
+        ub[:model.n][closed] = 0
+        model = model._replace(ub = ub)
+        if backend == "cplex" :
+            options["mip_start"] = np.concatenate((values[:model.n], values[model.n:][model.client*model.n + model.server]))
+        exact = solve(model, backend, **options)
+        if exact.values is not None and exact.objective < result.objective :
+            result, values = exact, dense_values(model, exact.values)
+        if exact.bound is not None :
+            bound = max(bound, min(exact.bound, result.objective))
+
+    # Only the bounds above are valid for the full model
+    if result.objective - bound <= target*max(1e-10, abs(result.objective)) :
+        status = "optimal"
+    else :
+        status = "feasible" if result.status == "optimal" else result.status
+    return result._replace(values = values, bound = bound, status = status), mask
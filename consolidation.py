@@ -0,0 +1,120 @@
+import numpy as np
+import time
+
+from backends import Result
+
+
+#-----------------------------------------------------------------------------
+# Exact solver for server consolidation
+#-----------------------------------------------------------------------------
+
+# In adaptation_servers.py q_{i,j} = r_{i}*d_{i} does not depend on the server,
+# so a solution is only a set of servers to power on : whatever their total
+# capacity K, the flows can be split over them freely, and the best ones fill
+# the capacity with the clients of highest gain per unit of demand r_{i}
+# (fractional knapsack, after the part alpha_{i}*d_{i} every client must get).
+# Its value G(K) is piecewise linear in K, so the problem is
+#   min over the open sets of  sum_j c_{j}*x_{j} - G(sum_j S_{j}*x_{j})
+# With integer capacities, the cheapest way to reach every total capacity k
+# is a 0-1 knapsack solved by dynamic programming over k, one server at a time
+# as a vectorized update of the table. Capacity past the demand that is worth
+# serving is of no use, so the table stops there and the last entry collects
+# all the larger totals. O(n*K) for K the total demand, and optimal.
+
+
+# Objective of the y columns per client, checked to be the same on every server
+def client_costs(model) :
+
+    if len(model.client) != model.n*model.m :
+        raise ValueError("the consolidation solver needs every (client, server) pair")
+    if not np.all(np.isfinite(model.capacity)) or np.any(model.capacity != np.round(model.capacity)) :
+        raise ValueError("the consolidation solver needs integer capacities")
+    if np.any(model.demand <= 0) :
+        raise ValueError("the consolidation solver needs positive demands")
+    o = np.zeros((model.m, model.n))
+    o[model.client, model.server] = model.obj[model.n:]
+    if np.any(np.abs(o - o[:, :1]) > 1e-9*np.maximum(1, np.abs(o[:, :1]))) :
+        raise ValueError("the consolidation solver needs q_{i,j} equal on every server")
+    return o[:, 0]
+
+
+# Cheapest cost of every total capacity 0..K (K for K and above) ; returns the
+# table and, per server, the states where it is taken and the state the
+# saturated entry K comes from
+def capacity_table(capacity, cost, K) :
+
+    dp = np.full(K + 1, np.inf)
+    dp[0] = 0
+    take = np.zeros((len(capacity), K + 1), dtype = bool)
+    source = np.zeros(len(capacity), dtype = int)
+    for j, (s, c) in enumerate(zip(capacity.astype(int).tolist(), cost.tolist())) :
+        new = dp.copy()
+        if s < K :
+            new[s:K] = np.minimum(dp[s:K], dp[:K-s] + c)
+        low = max(0, K - s)
+        source[j] = low + int(np.argmin(dp[low:]))
+        new[K] = min(dp[K], dp[source[j]] + c)
+        take[j] = new < dp
+        dp = new
+    return dp, take, source
+
+
+def solve_consolidation(model, progress = None) :
+
+    start = time.time()
+    o = client_costs(model)
+    demand, capacity = model.demand, model.capacity
+    cost = model.obj[:model.n]
+    if model.fulfil == "L" :
+        lo = np.zeros(model.m)
+    elif model.fulfil == "E" :
+        lo = np.ones(model.m)
+    else :
+        lo = np.asarray(model.tol, dtype = float)
+
+    ## Servers that can be opened several times (types of symmetry.py) are
+    ## copies of the same item
+    copies = np.repeat(np.arange(model.n), model.ub[:model.n].astype(int))
+
+    ## Value of the total capacity : mandatory part, then the optional demand of
+    ## the clients that gain from it, highest r_{i} first
+    gain = -o/demand
+    mandatory = lo*demand
+    optional = np.where(gain > 0, (1 - lo)*demand, 0)
+    order = np.argsort(-gain, kind = "stable")
+    filled = np.concatenate(([0], np.cumsum(optional[order])))
+    gained = np.concatenate(([0], np.cumsum((optional*gain)[order])))
+    low = mandatory.sum()
+    K = int(np.ceil(low + filled[-1] - 1e-9))
+
+    dp, take, source = capacity_table(capacity[copies], cost[copies], K)
+    k = np.arange(K + 1)
+    total = dp + (o*lo).sum() - np.interp(k - low, filled, gained)
+    total[k < low - 1e-9] = np.inf
+    if not np.isfinite(total).any() :
+        return Result("consolidation", "infeasible", None, None, None, None, time.time() - start, 0)
+
+    ## Open set, back through the table
+    state = int(np.argmin(total))
+    x = np.zeros(model.n)
+    for c in range(len(copies) - 1, -1, -1) :
+        if take[c, state] :
+            x[copies[c]] += 1
+            state = source[c] if state == K else state - int(capacity[copies[c]])
+
+    ## Flows : the served demand, in the order of the fill, laid over the open
+    ## capacity server after server
+    served = mandatory.copy()
+    extra = np.clip(min(np.dot(capacity, x), low + filled[-1]) - low - filled[:-1], 0, optional[order])
+    served[order] += extra
+    a = np.concatenate(([0], np.cumsum(served)))
+    b = np.concatenate(([0], np.cumsum(capacity*x)))
+    overlap = np.clip(np.minimum(a[1:, None], b[None, 1:]) - np.maximum(a[:-1, None], b[None, :-1]), 0, None)
+    y = overlap/demand[:, None]
+
+    values = np.concatenate((x, y[model.client, model.server]))
+    objective = float(np.dot(model.obj, values))
+    if progress is not None :
+        progress(objective, objective, 0)
+    return Result("consolidation", "optimal", objective, objective, values, None, time.time() - start, 0)
+
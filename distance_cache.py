@@ -0,0 +1,130 @@
+import numpy as np
+import hashlib
+import os
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+
+#-----------------------------------------------------------------------------
+# Persistent cache of network distances
+#-----------------------------------------------------------------------------
+
+# Distance rows are stored on disk per network topology, under a key made from
+# a hash of the CSR arrays of the graph :
+#   <key>.dist.npy  distance rows, one per source node, opened memory-mapped,
+#                   then one last row that starts with the sorted source nodes
+#                   of those rows (there are at most as many as nodes)
+# Rows and sources are in one file, replaced at once, so that a reader never
+# sees the rows of one writer with the sources of another.
+# A later run with the same topology opens the rows zero-copy and only runs
+# Dijkstra from the source nodes that are not cached yet. Entries are evicted
+# least recently used first once the directory grows past max_bytes.
+
+def graph_key(net, directed = False) :
+
+    net = csr_matrix(net, copy = True)
+    net.sum_duplicates()
+    net.sort_indices()
+    h = hashlib.sha256()
+    h.update(np.array(net.shape + (int(directed),), dtype = np.int64).tobytes())
+    h.update(net.indptr.astype(np.int64).tobytes())
+    h.update(net.indices.astype(np.int64).tobytes())
+    h.update(net.data.astype(np.float64).tobytes())
+    return h.hexdigest()
+
+
+class DistanceCache :
+
+    def __init__(self, directory, max_bytes = 2**30) :
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok = True)
+
+    def _path(self, key) :
+        return os.path.join(self.directory, key + ".dist.npy")
+
+    def _open(self, key) :
+        path = self._path(key)
+        try :
+            data = np.load(path, mmap_mode = "r")
+        except (FileNotFoundError, ValueError) :
+            return None, None
+        k = data.shape[0] - 1
+        if data.ndim != 2 or k < 1 or k > data.shape[1] :
+            return None, None
+        sources = np.array(data[k, :k]).astype(np.int64)
+        if np.any(np.diff(sources) <= 0) :
+            return None, None
+        os.utime(path)
+        return sources, data[:k]
+
+    # Distance rows from the given source nodes, in the order of `sources`
+    def distances(self, net, sources, directed = False) :
+
+        sources = np.asarray(sources, dtype = np.int64)
+        key = graph_key(net, directed)
+        cached, rows = self._open(key)
+
+        if cached is not None :
+            pos = np.minimum(np.searchsorted(cached, sources), len(cached) - 1)
+            hit = cached[pos] == sources
+            if hit.all() :
+                if len(sources) == len(cached) and (pos == np.arange(len(cached))).all() :
+                    return rows
+                return rows[pos]
+            missing = np.unique(sources[~hit])
+        else :
+            cached = np.zeros(0, dtype = np.int64)
+            missing = np.unique(sources)
+
+        computed = dijkstra(net, directed = directed, indices = missing).reshape(len(missing), -1)
+        merged, rows = self._store(key, cached, rows, missing, computed)
+        return rows[np.searchsorted(merged, sources)]
+
+    # Write the union of the cached and the new rows to a fresh entry
+    def _store(self, key, cached, rows, missing, computed) :
+
+        path = self._path(key)
+        sources = np.union1d(cached, missing)
+        k = len(sources)
+        tmp = path + "." + str(os.getpid()) + ".tmp"
+
+        out = np.lib.format.open_memmap(tmp, mode = "w+", dtype = np.float64,
+                                        shape = (k + 1, computed.shape[1]))
+        if len(cached) :
+            out[np.searchsorted(sources, cached)] = rows
+        out[np.searchsorted(sources, missing)] = computed
+        out[k] = np.nan
+        out[k, :k] = sources
+        out.flush()
+        del out
+        os.replace(tmp, path)
+
+        self._evict(keep = key)
+        return sources, np.load(path, mmap_mode = "r")[:k]
+
+    # Least recently used entries go first ; the entry just written is kept
+    def _evict(self, keep) :
+
+        entries = []
+        for name in os.listdir(self.directory) :
+            if not name.endswith(".dist.npy") :
+                continue
+            key = name[:-len(".dist.npy")]
+            path = self._path(key)
+            try :
+                entries.append((os.path.getmtime(path), os.path.getsize(path), key))
+            except FileNotFoundError :
+                continue
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries) :
+            if total <= self.max_bytes :
+                break
+            if key == keep :
+                continue
+            try :
+                os.remove(self._path(key))
+            except FileNotFoundError :
+                pass
+            total -= size
@@ -0,0 +1,194 @@
+import numpy as np
+from scipy.sparse import csr_matrix, triu
+from scipy.sparse.csgraph import dijkstra
+import heapq
+
+
+#-----------------------------------------------------------------------------
+# Shortest paths kept up to date when link weights change
+#-----------------------------------------------------------------------------
+
+# The shortest path trees from the distinct client nodes (distances and
+# predecessors) are computed once, then repaired edge by edge :
+#   weight decrease : if the edge now shortens the path to one of its ends,
+#                     Dijkstra is run again from there, only through the nodes
+#                     whose distance improves
+#   weight increase : (or link removed, weight inf) only matters when the edge
+#   or removal        is in the tree. The subtree under it loses its
+#                     distances, they are seeded from the neighbours outside
+#                     of the subtree and Dijkstra is run again inside it
+# Every update returns, per source row, the nodes whose distance changed, and
+# q_updates turns them into the (i, j) entries of q that changed.
+
+class DynamicDistances :
+
+    def __init__(self, net, nodes) :
+
+        ## One weight per link, the smallest of its two directions as scipy's
+        ## undirected Dijkstra does, whether net holds one direction or both
+        coo = csr_matrix(net).tocoo()
+        self.n = coo.shape[0]
+        u, v = np.minimum(coo.row, coo.col), np.maximum(coo.row, coo.col)
+        order = np.lexsort((coo.data, v, u))
+        u, v, w = u[order], v[order], coo.data[order]
+        first = np.ones(len(u), dtype = bool)
+        first[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+        u, v, w = u[first], v[first], w[first]
+        sym = csr_matrix((np.concatenate((w, w)), (np.concatenate((u, v)), np.concatenate((v, u)))),
+                         shape = (self.n, self.n))
+        self.adj = [dict(zip(sym.indices[sym.indptr[u]:sym.indptr[u+1]].tolist(),
+                             sym.data[sym.indptr[u]:sym.indptr[u+1]].tolist())) for u in range(self.n)]
+        self.sources, self.inverse = np.unique(np.asarray(nodes), return_inverse = True)
+        self.inverse = self.inverse.reshape(-1)
+        dist, pred = dijkstra(sym, directed = False, indices = self.sources, return_predecessors = True)
+        self.dist = dist.reshape(len(self.sources), -1)
+        self.pred = pred.reshape(len(self.sources), -1)
+
+    def weight(self, u, v) :
+        return self.adj[u].get(v, np.inf)
+
+    # Current network, as the upper triangle of a CSR matrix like network.random_network
+    def to_csr(self) :
+        rows = [u for u in range(self.n) for v in self.adj[u] if v > u]
+        cols = [v for u in range(self.n) for v in self.adj[u] if v > u]
+        data = [self.adj[u][v] for u, v in zip(rows, cols)]
+        return triu(csr_matrix((data, (rows, cols)), shape = (self.n, self.n))).tocsr()
+
+
+    ## Updates
+
+    # New weight w of the link (u, v) (np.inf removes it) ; returns
+    # {source row: nodes whose distance changed}
+    def update(self, u, v, w) :
+
+        old = self.weight(u, v)
+        if w == np.inf :
+            self.adj[u].pop(v, None)
+            self.adj[v].pop(u, None)
+        else :
+            self.adj[u][v] = self.adj[v][u] = float(w)
+
+        changes = {}
+        for s in range(len(self.sources)) :
+            if w < old :
+                changed = self._decrease(s, u, v, w)
+            elif w > old :
+                changed = self._increase(s, u, v)
+            else :
+                changed = []
+            if len(changed) :
+                changes[s] = np.array(sorted(changed))
+        return changes
+
+    # Several updates (u, v, w) in a row ; the changed nodes are merged
+    def update_many(self, edges) :
+
+        changes = {}
+        for u, v, w in edges :
+            for s, nodes in self.update(u, v, w).items() :
+                changes[s] = np.union1d(changes.get(s, []), nodes).astype(int)
+        return changes
+
+    def _decrease(self, s, u, v, w) :
+
+        dist, pred = self.dist[s], self.pred[s]
+        heap = []
+        for a, b in ((u, v), (v, u)) :
+            if dist[a] + w < dist[b] :
+                dist[b] = dist[a] + w
+                pred[b] = a
+                heapq.heappush(heap, (dist[b], b))
+        return self._settle(s, heap)
+
+    def _increase(self, s, u, v) :
+
+        dist, pred = self.dist[s], self.pred[s]
+        if pred[v] == u :
+            root = v
+        elif pred[u] == v :
+            root = u
+        else :
+            return []
+
+        subtree = self._subtree(pred, root).tolist()
+        before = dist[subtree].copy()
+        inside = set(subtree)
+        dist[subtree] = np.inf
+        pred[subtree] = -9999
+        heap = []
+        for x in subtree :
+            for y, wy in self.adj[x].items() :
+                if y not in inside and dist[y] + wy < dist[x] :
+                    dist[x] = dist[y] + wy
+                    pred[x] = y
+            if dist[x] < np.inf :
+                heapq.heappush(heap, (dist[x], x))
+        self._settle(s, heap)
+        return [x for x, d in zip(subtree, before.tolist()) if dist[x] != d]
+
+    # Subtree of root in the shortest path tree pred : the nodes sorted by
+    # predecessor give the children of every node as a slice, and the tree is
+    # walked level by level
+    def _subtree(self, pred, root) :
+
+        order = np.argsort(pred, kind = "stable")
+        start = np.searchsorted(pred[order], np.arange(self.n + 1))
+        level, levels = np.array([root]), []
+        while len(level) :
+            levels.append(level)
+            first, count = start[level], start[level + 1] - start[level]
+            offset = np.repeat(first - np.cumsum(count) + count, count)
+            level = order[offset + np.arange(count.sum())]
+        return np.concatenate(levels)
+
+    # Dijkstra from the nodes of the heap, relaxing only the edges that improve
+    # a distance ; returns the nodes improved
+    def _settle(self, s, heap) :
+
+        dist, pred = self.dist[s], self.pred[s]
+        changed = set(x for _, x in heap)
+        while heap :
+            d, x = heapq.heappop(heap)
+            if d > dist[x] :
+                continue
+            for y, wy in self.adj[x].items() :
+                if d + wy < dist[y] :
+                    dist[y] = d + wy
+                    pred[y] = x
+                    changed.add(y)
+                    heapq.heappush(heap, (dist[y], y))
+        return changed
+
+
+#-----------------------------------------------------------------------------
+# Changed entries of q
+#-----------------------------------------------------------------------------
+
+# Entries of q = (c_{j} + dist(node_{i}, j))*d_{i} (see network.transport_gain)
+# touched by the changes of an update : returns i, j and the new q_{i,j}
+def q_updates(dd, changes, cost, demand) :
+
+    cost = np.asarray(cost, dtype = float)
+    demand = np.asarray(demand, dtype = float)
+    rows, cols = [np.zeros(0, dtype = int)], [np.zeros(0, dtype = int)]
+    for s, nodes in changes.items() :
+        clients = np.flatnonzero(dd.inverse == s)
+        rows.append(np.repeat(clients, len(nodes)))
+        cols.append(np.tile(nodes, len(clients)))
+    i, j = np.concatenate(rows), np.concatenate(cols)
+    return i, j, (cost[j] + dd.dist[dd.inverse[i], j])*demand[i]
+
+
+# Model with the objective of the changed y_{i,j} columns replaced (sign = 1
+# for a cost to minimize as in with_network.py). Pairs without a column are
+# skipped, and the pairs that cannot be reached anymore get an upper bound 0.
+def update_objective(model, i, j, q, sign = 1) :
+
+    key = model.client*model.n + model.server
+    pos = np.searchsorted(key, i*model.n + j)
+    found = (pos < len(key)) & (key[np.minimum(pos, len(key) - 1)] == i*model.n + j)
+    cols, q = model.n + pos[found], q[found]
+    obj, ub = model.obj.copy(), model.ub.copy()
+    obj[cols] = np.where(np.isfinite(q), sign*q, 0)
+    ub[cols] = np.isfinite(q)
+    return model._replace(obj = obj, ub = ub)
@@ -0,0 +1,174 @@
+import numpy as np
+import itertools
+import time
+
+from backends import cplex_result
+
+
+#-----------------------------------------------------------------------------
+# Long-lived model for warm re-solves
+#-----------------------------------------------------------------------------
+
+# Aggregated model of adaptation_compute.py / with_network.py kept alive in a
+# single cplex.Cplex object, so that a few clients arriving or a server going
+# offline only touch the affected columns and rows :
+#   columns x_{j} ("x<j>"), then y_{i,j} ("y<key>_<j>") for every client
+#   rows    capacity "cap<j>" : sum_i d_{i}*y_{i,j} - S_{j}*x_{j} <= 0
+#           demand   "dem<key>" : == 1 when the online servers can take all the
+#           demand, ranged alpha_{i} <= . <= 1 otherwise
+# Every re-solve starts from the previous solution as a MIP start, and CPLEX
+# reuses the previous LP basis (advanced start).
+
+class IncrementalModel :
+
+    def __init__(self, capacity, cost, threads = None, log = False) :
+        import cplex
+        self._cplex = cplex
+
+        self.capacity = np.asarray(capacity, dtype = float).copy()
+        self.cost = np.asarray(cost, dtype = float).copy()
+        self.online = np.ones(len(self.capacity), dtype = bool)
+        self.n = len(self.capacity)
+        self.clients = {}               # key -> (demand, tol)
+        self.regime = None              # "E" or "tol"
+        self.result = None
+        self._start = None              # (names, values, client keys) of the last solution
+        self._keys = itertools.count()
+
+        flp = cplex.Cplex()
+        if not log :
+            flp.set_log_stream(None)
+            flp.set_results_stream(None)
+        if threads is not None :
+            flp.parameters.threads.set(threads)
+        flp.parameters.advance.set(1)
+
+        ## Servers : the x columns and the capacity rows always come first, so
+        ## their indices never move when clients are removed
+        n = self.n
+        flp.variables.add(obj = self.cost.tolist(),
+                          lb = [0]*n,
+                          ub = [1]*n,
+                          types = "B"*n,
+                          names = ["x" + str(j) for j in range(n)])
+        flp.linear_constraints.add(senses = "L"*n,
+                                   rhs = [0.0]*n,
+                                   names = ["cap" + str(j) for j in range(n)])
+        flp.linear_constraints.set_coefficients([(j, j, -self.capacity[j]) for j in range(n)])
+        self.flp = flp
+
+
+    ## Clients
+
+    # q_row is the objective coefficient of y_{i,j} for every server j
+    def add_client(self, demand, q_row, tol = 1.0, key = None) :
+
+        if key is None :
+            key = next(self._keys)
+        if key in self.clients :
+            raise KeyError("client already in the model: " + str(key))
+        n, flp, cplex = self.n, self.flp, self._cplex
+
+        row = "dem" + str(key)
+        flp.linear_constraints.add(senses = "E", rhs = [1.0], names = [row])
+        r = flp.linear_constraints.get_indices(row)
+        flp.variables.add(obj = np.asarray(q_row, dtype = float).tolist(),
+                          lb = [0]*n,
+                          ub = [1]*n,
+                          names = ["y" + str(key) + "_" + str(j) for j in range(n)],
+                          columns = [cplex.SparsePair(ind = [j, r], val = [float(demand), 1.0]) for j in range(n)])
+
+        self.clients[key] = (float(demand), float(tol))
+        self._refresh_fulfil(new = [key])
+        return key
+
+    def remove_client(self, key) :
+
+        self.clients.pop(key)
+        self.flp.variables.delete(["y" + str(key) + "_" + str(j) for j in range(self.n)])
+        self.flp.linear_constraints.delete("dem" + str(key))
+        self._refresh_fulfil()
+
+
+    ## Servers
+
+    def set_online(self, j, online = True) :
+        self.online[j] = online
+        self.flp.variables.set_upper_bounds(j, 1.0 if online else 0.0)
+        self._refresh_fulfil()
+
+    def set_capacity(self, j, capacity) :
+        self.capacity[j] = capacity
+        self.flp.linear_constraints.set_coefficients(j, j, -float(capacity))
+        self._refresh_fulfil()
+
+    def set_cost(self, j, cost) :
+        self.cost[j] = cost
+        self.flp.objective.set_linear(j, float(cost))
+
+
+    # If all demands can be fullfilled they are, and if not then the clients'
+    # demand are satisfied with their tolerance. Only the rows whose sense
+    # changes are touched.
+    def _refresh_fulfil(self, new = ()) :
+
+        demand = sum(d for d, _ in self.clients.values())
+        regime = "E" if demand <= self.capacity[self.online].sum() else "tol"
+        keys = list(self.clients) if regime != self.regime else list(new)
+        self.regime = regime
+        if not keys :
+            return
+
+        rows = ["dem" + str(k) for k in keys]
+        if regime == "E" :
+            self.flp.linear_constraints.set_senses([(r, "E") for r in rows])
+            self.flp.linear_constraints.set_rhs([(r, 1.0) for r in rows])
+            self.flp.linear_constraints.set_range_values([(r, 0.0) for r in rows])
+        else :
+            tol = [self.clients[k][1] for k in keys]
+            self.flp.linear_constraints.set_senses([(r, "R") for r in rows])
+            self.flp.linear_constraints.set_rhs(list(zip(rows, tol)))
+            self.flp.linear_constraints.set_range_values([(r, 1.0 - t) for r, t in zip(rows, tol)])
+
+
+    ## Solve
+
+    def solve(self, time_limit = None, mip_gap = None) :
+
+        flp = self.flp
+        if time_limit is not None :
+            flp.parameters.timelimit.set(time_limit)
+        if mip_gap is not None :
+            flp.parameters.mip.tolerances.mipgap.set(mip_gap)
+
+        # Previous solution as a MIP start, restricted to the columns that
+        # still exist ; CPLEX repairs it if the change made it infeasible
+        if flp.MIP_starts.get_num() :
+            flp.MIP_starts.delete()
+        if self._start is not None :
+            names, values, _ = self._start
+            existing = set(flp.variables.get_names())
+            start = [(a, v) for a, v in zip(names, values) if a in existing]
+            if start :
+                ind, val = zip(*start)
+                flp.MIP_starts.add(self._cplex.SparsePair(ind = list(ind), val = list(val)),
+                                   flp.MIP_starts.effort_level.repair)
+
+        begin = time.time()
+        flp.solve()
+        self.result = cplex_result(flp, False, time.time() - begin)
+        if self.result.values is not None :
+            self._start = (flp.variables.get_names(), self.result.values.tolist(), list(self.clients))
+        return self.result
+
+    # x_{j} of the last solution
+    @property
+    def x_sol(self) :
+        return self.result.values[:self.n]
+
+    # y_{i,j} row of every client of the last solution (the clients as they
+    # were when it was solved)
+    @property
+    def y_sol(self) :
+        y = self.result.values[self.n:].reshape(-1, self.n)
+        return dict(zip(self._start[2], y))
@@ -0,0 +1,154 @@
+import numpy as np
+from collections import namedtuple
+import json
+import os
+import time
+from scipy.sparse import csr_matrix
+
+from sparse_model import build_model, fulfil_rule
+from network import random_network, client_distances, transport_gain
+
+
+#-----------------------------------------------------------------------------
+# Instances as contiguous arrays
+#-----------------------------------------------------------------------------
+
+# Column views of the servers and the clients of an instance : every field is
+# an array over the servers (resp. the clients)
+Server = namedtuple('Server', ('num',         # Server number, j
+                               'capacity',    # Capacity of the server, S_{j}
+                               'cost'))       # Cost of the server, c_{j}
+
+Client = namedtuple('Client', ('num',         # Client number, i (node of its data for "network")
+                               'demand',      # Demand of the client, d_{i}
+                               'gain',        # Unitary gain to satisfy the demand, r_{i}
+                               'tol'))        # Minimum delivery rate desired by the client, alpha_{i}
+
+
+# How every variant of the repository builds its model from q :
+#   "flp"      facility_location_problem.py   profit (gain - transport) to maximize
+#   "servers"  adaptation_servers.py          gain of the computed data to maximize
+#   "compute"  adaptation_compute.py          computing cost to minimize
+#   "network"  with_network.py                computing + transport cost to minimize
+VARIANTS = {"flp":     {"formulation": "weak",       "sign": -1, "fulfil": "L"},
+            "servers": {"formulation": "weak",       "sign": -1, "fulfil": "L"},
+            "compute": {"formulation": "aggregated", "sign": -1, "fulfil": "rule"},
+            "network": {"formulation": "aggregated", "sign": 1,  "fulfil": "rule"}}
+
+
+class Instance :
+
+    def __init__(self, variant, capacity, cost, demand, gain, tol, q, node = None, net = None) :
+        if variant not in VARIANTS :
+            raise ValueError("unknown variant: " + str(variant))
+        self.variant = variant
+        self.capacity = np.ascontiguousarray(capacity, dtype = float)
+        self.cost = np.ascontiguousarray(cost, dtype = float)
+        self.demand = np.ascontiguousarray(demand, dtype = float)
+        self.gain = np.ascontiguousarray(gain, dtype = float)
+        self.tol = np.ascontiguousarray(tol, dtype = float)
+        self.q = np.ascontiguousarray(q, dtype = float)
+        self.node = None if node is None else np.ascontiguousarray(node, dtype = np.int64)
+        self.net = net
+        self.n, self.m = len(self.capacity), len(self.demand)
+
+    @property
+    def servers(self) :
+        return Server(np.arange(self.n), self.capacity, self.cost)
+
+    @property
+    def clients(self) :
+        return Client(np.arange(self.m) if self.node is None else self.node, self.demand, self.gain, self.tol)
+
+    # Model of the variant, see sparse_model.build_model for the options
+    def model(self, **options) :
+        v = VARIANTS[self.variant]
+        fulfil = fulfil_rule(self.demand, self.capacity) if v["fulfil"] == "rule" else v["fulfil"]
+        ## Pairs whose data cannot reach the server (disconnected network) get no column
+        reachable = np.isfinite(self.q)
+        if not reachable.all() :
+            options["mask"] = reachable if options.get("mask") is None else reachable & options["mask"]
+        return build_model(self.capacity, self.cost, self.demand, v["sign"]*self.q,
+                           **dict({"formulation": v["formulation"], "fulfil": fulfil, "tol": self.tol}, **options))
+
+
+    ## On-disk format : one .npy per array in a directory, opened memory-mapped
+
+    _arrays = ("capacity", "cost", "demand", "gain", "tol", "q", "node")
+
+    def save(self, directory) :
+        os.makedirs(directory, exist_ok = True)
+        for name in self._arrays :
+            if getattr(self, name) is not None :
+                np.save(os.path.join(directory, name + ".npy"), getattr(self, name))
+        if self.net is not None :
+            net = csr_matrix(self.net)
+            for name in ("indptr", "indices", "data") :
+                np.save(os.path.join(directory, "net_" + name + ".npy"), getattr(net, name))
+        with open(os.path.join(directory, "instance.json"), "w") as f :
+            json.dump({"variant": self.variant, "n": self.n, "m": self.m,
+                       "network": self.net is not None}, f)
+
+    @classmethod
+    def load(cls, directory, mmap = True) :
+        mode = "r" if mmap else None
+        with open(os.path.join(directory, "instance.json")) as f :
+            meta = json.load(f)
+        arrays = {}
+        for name in cls._arrays :
+            path = os.path.join(directory, name + ".npy")
+            arrays[name] = np.load(path, mmap_mode = mode) if os.path.exists(path) else None
+        net = None
+        if meta["network"] :
+            net = csr_matrix(tuple(np.load(os.path.join(directory, "net_" + name + ".npy"), mmap_mode = mode)
+                                   for name in ("data", "indices", "indptr")),
+                             shape = (meta["n"], meta["n"]))
+        return cls(meta["variant"], net = net, **arrays)
+
+
+#-----------------------------------------------------------------------------
+# Random instances
+#-----------------------------------------------------------------------------
+
+# Same distributions as the example of every script, drawn in one vectorized
+# call per array from an explicitly seeded generator. Sizes left to None are
+# drawn in the script's range. With a timings dict, the time spent in the
+# shortest paths is stored in timings["distances"].
+def random_instance(variant, n = None, m = None, seed = None, th = 0.2, cache = None, timings = None) :
+
+    rng = np.random.default_rng(seed)
+    sizes = {"flp": ((5, 5), (1, 1)), "servers": ((10, 20), (10, 20)),
+             "compute": ((5, 15), (2, 5)), "network": ((100, 100), (30, 30))}[variant]
+    n = int(rng.integers(sizes[0][0], sizes[0][1] + 1)) if n is None else n
+    m = int(rng.integers(sizes[1][0], sizes[1][1] + 1)) if m is None else m
+
+    capacity = rng.integers(4, 9, n)
+    cost = rng.integers(10, 51, n)
+    tol = rng.random(m)
+    node, net = None, None
+
+    if variant == "flp" :
+        demand = rng.integers(1, 6, m)
+        gain = rng.integers(10, 51, m)
+        t = rng.integers(15, 80, (m, n))
+        q = (gain[:, None] - t)*demand[:, None]
+    elif variant == "servers" :
+        demand = rng.integers(1, 6, m)
+        gain = rng.integers(10, 51, m)
+        q = np.broadcast_to((gain*demand)[:, None], (m, n))
+    elif variant == "compute" :
+        demand = rng.integers(5, 31, m)
+        gain = np.zeros(m)
+        q = -cost[None, :]*demand[:, None]
+    else :
+        demand = rng.integers(10, 16, m)
+        gain = np.zeros(m)
+        node = rng.integers(0, n, m)
+        net = random_network(n, th, seed = rng)
+        start = time.time()
+        dist, source = client_distances(net, node, cache)
+        if timings is not None :
+            timings["distances"] = time.time() - start
+        q = transport_gain(cost, demand, dist, source)
+
+    return Instance(variant, capacity, cost, demand, gain, tol, q, node, net)
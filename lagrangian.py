@@ -0,0 +1,266 @@
+import numpy as np
+import time
+
+from backends import Result, solve_highs
+
+
+#-----------------------------------------------------------------------------
+# Lagrangian relaxation heuristic
+#-----------------------------------------------------------------------------
+
+# Heuristic for instances too large for the exact MIP. The fulfilment rows
+#   lo_{i} <= sum_j y_{i,j} <= 1        (lo_{i} = 0, 1 or alpha_{i})
+# are relaxed with multipliers lambda_{i}. What is left splits per server :
+# opening j costs c_{j} + the best fractional knapsack of the clients whose
+# reduced cost C_{i,j} + lambda_{i} is negative, within S_{j}. This gives a
+# valid lower bound for any lambda, improved by subgradient steps. Each round
+# the open set of the subproblems is repaired to a feasible one, the flows
+# are filled greedily and the best solution is improved by local search
+# (close / open / swap one server). With polish, the flows of the final open
+# set are replaced by the optimal ones of the transport LP that is left once
+# x is fixed (HiGHS, through scipy).
+
+
+# Dense view of a model : C_{i,j} (inf for the pairs without a column), and
+# the lower bound lo_{i} of every client's fulfilment row
+def dense_costs(model) :
+
+    if np.any(model.ub[:model.n] > 1) :
+        raise ValueError("the Lagrangian heuristic needs binary x_{j}")
+    C = np.full((model.m, model.n), np.inf)
+    C[model.client, model.server] = model.obj[model.n:]
+    if model.fulfil == "L" :
+        lo = np.zeros(model.m)
+    elif model.fulfil == "E" :
+        lo = np.ones(model.m)
+    else :
+        lo = np.asarray(model.tol, dtype = float)
+    return C, lo
+
+
+#-----------------------------------------------------------------------------
+# Lagrangian subproblem
+#-----------------------------------------------------------------------------
+
+# Fractional knapsack of every server at once ; returns the value of every
+# server when opened and the rates y_{i,j} it would take
+def knapsacks(R, demand, capacity) :
+
+    m, n = R.shape
+    neg = R < 0
+    ratio = np.where(neg, R/demand[:, None], np.inf)
+    order = np.argsort(ratio, axis = 0)
+    cols = np.arange(n)[None, :]
+
+    d_sorted = demand[order]*neg[order, cols]
+    prev = np.cumsum(d_sorted, axis = 0) - d_sorted
+    with np.errstate(divide = "ignore", invalid = "ignore") :
+        frac = np.where(d_sorted > 0, np.clip((capacity[None, :] - prev)/d_sorted, 0, 1), 0)
+
+    y = np.zeros((m, n))
+    y[order, cols] = frac
+    value = np.where(neg, R, 0)
+    return (value*y).sum(axis = 0), y
+
+
+def lagrangian_bound(lam, C, cost, demand, capacity, lo) :
+
+    value, y = knapsacks(C + lam[:, None], demand, capacity)
+    v = cost + value
+    opened = v < 0
+    constant = np.where(lam >= 0, -lam, -lam*lo).sum()
+    return np.minimum(v, 0).sum() + constant, opened, y*opened[None, :]
+
+
+#-----------------------------------------------------------------------------
+# Primal side
+#-----------------------------------------------------------------------------
+
+# Greedy flows for a set of opened servers : first every client gets lo_{i}
+# from its cheapest servers by unitary cost, then the pairs with a negative
+# cost are filled up to 1. Returns None if the lower bounds cannot be reached.
+# Each of the two passes goes through the k cheapest servers of every client
+# only, then again with twice as many servers not yet full for the clients
+# still short, and so on, so that the Python loop does not visit all the m*n
+# pairs.
+def greedy_flows(C, demand, capacity, lo, opened, k = 8) :
+
+    m, n = C.shape
+    y = np.zeros((m, n))
+    left = np.where(opened, capacity, 0.0).tolist()
+    rate = [0.0]*m
+    d = demand.tolist()
+
+    usable = np.isfinite(C) & opened[None, :]
+    unit = np.where(usable, C, np.inf)/demand[:, None]
+
+    def fill(i_all, j_all, goal) :
+        for k in np.argsort(unit[i_all, j_all], kind = "stable").tolist() :
+            i, j = int(i_all[k]), int(j_all[k])
+            if rate[i] >= goal[i] or left[j] <= 0 :
+                continue
+            r = min(goal[i] - rate[i], left[j]/d[i])
+            y[i, j] += r
+            rate[i] += r
+            left[j] -= r*d[i]
+            if goal[i] - rate[i] <= 1e-12 :
+                rate[i] = goal[i]
+
+    ## 1. lower bounds, 2. profitable flows
+    for goal, allowed in ((lo.tolist(), usable), ([1.0]*m, usable & (unit < 0))) :
+        short, width = np.array(rate) < np.array(goal), k
+        while True :
+            pairs = allowed & short[:, None] & (np.array(left) > 0)[None, :]
+            if not pairs.any() :
+                break
+            rows = np.flatnonzero(short)
+            near = np.argpartition(np.where(pairs[rows], unit[rows], np.inf), min(width, n) - 1, axis = 1)[:, :width]
+            i_all = np.repeat(rows, near.shape[1])
+            keep = pairs[i_all, near.reshape(-1)]
+            fill(i_all[keep], near.reshape(-1)[keep], goal)
+            short = np.array(rate) < np.array(goal)
+            if width >= n :
+                break
+            width *= 2
+
+    if np.any(np.array(rate) < lo - 1e-9) :
+        return None
+    return y
+
+
+def primal_cost(C, cost, opened, y) :
+    return cost[opened].sum() + np.where(y > 0, C*y, 0).sum()
+
+
+# Open the cheapest servers per unit of capacity until the opened capacity
+# covers the demand that must be served
+def repair(opened, cost, demand, capacity, lo) :
+
+    opened = opened.copy()
+    required = demand @ lo
+    for j in np.argsort(cost/np.maximum(capacity, 1e-12)) :
+        if capacity[opened].sum() >= required :
+            break
+        opened[j] = True
+    return opened
+
+
+def evaluate(C, cost, demand, capacity, lo, opened) :
+    y = greedy_flows(C, demand, capacity, lo, opened)
+    if y is None :
+        return np.inf, None
+    return primal_cost(C, cost, opened, y), y
+
+
+# First improvement local search over close / open / swap moves ; servers
+# are tried in the order of their Lagrangian value v_{j}
+def local_search(C, cost, demand, capacity, lo, opened, best, y, v, deadline) :
+
+    improved = True
+    while improved and time.time() < deadline :
+        improved = False
+        moves = [("close", j) for j in np.flatnonzero(opened)[np.argsort(-v[opened])]]
+        moves += [("open", j) for j in np.flatnonzero(~opened)[np.argsort(v[~opened])]]
+        for kind, j in moves :
+            if time.time() >= deadline :
+                break
+            trial = opened.copy()
+            trial[j] = kind == "open"
+            value, trial_y = evaluate(C, cost, demand, capacity, lo, trial)
+            if kind == "close" and value >= best :
+                # swap : close j and open the best closed server instead
+                closed = np.flatnonzero(~opened)
+                if len(closed) :
+                    trial[closed[np.argmin(v[closed])]] = True
+                    value, trial_y = evaluate(C, cost, demand, capacity, lo, trial)
+            if value < best - 1e-9 :
+                opened, best, y, improved = trial, value, trial_y, True
+                break
+    return opened, best, y
+
+
+#-----------------------------------------------------------------------------
+# Solver
+#-----------------------------------------------------------------------------
+
+# Backend "lagrangian" : same interface as backends.solve_cplex / solve_highs,
+# the bound of the Result is the best Lagrangian bound and nodes counts the
+# subgradient iterations
+def solve_lagrangian(model, relax = False, time_limit = None, mip_gap = 1e-4, threads = None, log = False,
+                     iterations = 500, heuristic_every = 10, patience = 20, polish = True, progress = None) :
+
+    if relax :
+        raise ValueError("the Lagrangian heuristic has no LP relaxation")
+    start = time.time()
+    deadline = start + (time_limit if time_limit is not None else np.inf)
+    mip_gap = 1e-4 if mip_gap is None else mip_gap
+
+    C, lo = dense_costs(model)
+    cost = model.obj[:model.n]
+    demand, capacity = model.demand, model.capacity
+    C_finite = np.where(np.isfinite(C), C, 1e30)
+
+    lam = np.zeros(model.m)
+    bound, best = -np.inf, np.inf
+    best_open, best_y = None, None
+    theta, stall = 2.0, 0
+
+    for it in range(iterations) :
+        value, opened, y = lagrangian_bound(lam, C_finite, cost, demand, capacity, lo)
+        if value > bound + 1e-9 :
+            bound, stall = value, 0
+        else :
+            stall += 1
+            if stall >= patience :
+                theta, stall = theta/2, 0
+
+        ## Primal solution from the open set of the subproblem
+        if it % heuristic_every == 0 :
+            trial = repair(opened, cost, demand, capacity, lo)
+            primal, trial_y = evaluate(C, cost, demand, capacity, lo, trial)
+            if primal < best :
+                best, best_open, best_y = primal, trial, trial_y
+
+        if log :
+            print("iteration", it, "bound", bound, "best", best)
+        if progress is not None :
+            progress(best if best < np.inf else None, bound, it + 1)
+        if best < np.inf and abs(best - bound) <= mip_gap*max(1e-10, abs(best)) :
+            break
+        if time.time() >= deadline or theta < 1e-6 :
+            break
+
+        ## Subgradient step
+        rate = y.sum(axis = 1)
+        g = np.where(lam > 0, rate - 1, np.where(lam < 0, rate - lo,
+                     np.maximum(rate - 1, 0) + np.minimum(rate - lo, 0)))
+        norm = g @ g
+        if norm == 0 :
+            break
+        target = best if best < np.inf else abs(bound) + 1
+        lam = lam + theta*(target - value)/norm*g
+        lam[lo == 0] = np.maximum(lam[lo == 0], 0)
+
+    ## Local search on the best solution
+    if best_open is not None and time.time() < deadline :
+        v = cost + knapsacks(C_finite + lam[:, None], demand, capacity)[0]
+        best_open, best, best_y = local_search(C, cost, demand, capacity, lo, best_open, best, best_y, v, deadline)
+
+    if best_open is None :
+        return Result("lagrangian", "limit", None, bound, None, None, time.time() - start, it + 1)
+    values = np.concatenate((best_open.astype(float), best_y[model.client, model.server]))
+
+    ## Optimal flows for the opened servers, within the time left
+    if polish and time.time() < deadline :
+        lb, ub = model.lb.copy(), model.ub.copy()
+        lb[:model.n] = ub[:model.n] = best_open
+        left = deadline - time.time()
+        lp = solve_highs(model._replace(lb = lb, ub = ub), relax = True,
+                         time_limit = left if np.isfinite(left) else None)
+        if lp.objective is not None and lp.objective < best :
+            best, values = lp.objective, lp.values
+
+    solve_time = time.time() - start
+    gap = abs(best - bound)/max(1e-10, abs(best))
+    return Result("lagrangian", "optimal" if gap <= mip_gap else "feasible", best, min(bound, best),
+                  values, None, solve_time, it + 1)
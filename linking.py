@@ -0,0 +1,123 @@
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
+import time
+
+from backends import solve
+
+
+#-----------------------------------------------------------------------------
+# Lazy linking rows
+#-----------------------------------------------------------------------------
+
+# The weak and strong formulations add one row y_{i,j} - x_{j} <= 0 per (i, j)
+# pair. On top of the aggregated capacity sum_i d_{i}*y_{i,j} <= S_{j}*x_{j}
+# they are redundant at integer points (x_{j} = 0 forces every y_{i,j} to 0),
+# and only tighten the LP relaxation. So the model starts from the aggregated
+# formulation and only the linking rows violated by a relaxation point are
+# added :
+#   CPLEX   : user cuts, from a generic callback in the relaxation context,
+#             at every node
+#   others  : cutting plane on the LP relaxation, solved again with the
+#             violated rows until none is left, then the MIP with those rows
+# The model grows with the cuts that were needed only.
+
+
+# Pairs (index of the y column) whose linking row is violated by values
+def violated(model, values, eps = 1e-6, max_cuts = None) :
+
+    excess = values[model.n:] - values[:model.n][model.server]
+    k = np.flatnonzero(excess > eps)
+    if max_cuts is not None and len(k) > max_cuts :
+        k = k[np.argsort(-excess[k], kind = "stable")[:max_cuts]]
+    return k
+
+
+def linking_rows(model, pairs) :
+
+    c = len(pairs)
+    return csr_matrix((np.concatenate((np.ones(c), -np.ones(c))),
+                       (np.tile(np.arange(c), 2), np.concatenate((model.n + pairs, model.server[pairs])))),
+                      shape = (c, model.A.shape[1]))
+
+
+def add_linking(model, pairs) :
+
+    return model._replace(A = vstack((model.A, linking_rows(model, pairs))).tocsr(),
+                          senses = np.concatenate((model.senses, np.full(len(pairs), "L"))),
+                          rhs = np.concatenate((model.rhs, np.zeros(len(pairs)))))
+
+
+#-----------------------------------------------------------------------------
+# CPLEX : user cuts
+#-----------------------------------------------------------------------------
+
+# Generic callback : in the relaxation context, the most violated linking rows
+# are added as user cuts (CPLEX may purge them later) ; in the global
+# progress context, it passes on to the progress option of the backends
+class LinkingCallback :
+
+    def __init__(self, model, eps, max_cuts, progress = None) :
+        import cplex
+        from backends import ProgressCallback
+        self.model, self.eps, self.max_cuts = model, eps, max_cuts
+        self.progress = None if progress is None else ProgressCallback(progress)
+        self.context_id = cplex.callbacks.Context.id
+        self.pair = cplex.SparsePair
+        self.purge = cplex.callbacks.UserCutCallback.use_cut.purge
+        self.cuts = 0
+
+    def contexts(self) :
+        if self.progress is None :
+            return self.context_id.relaxation
+        return self.context_id.relaxation | self.context_id.global_progress
+
+    def invoke(self, context) :
+        if context.get_id() == self.context_id.global_progress :
+            self.progress.invoke(context)
+            return
+        values = np.array(context.get_relaxation_point())
+        pairs = violated(self.model, values, self.eps, self.max_cuts)
+        if not len(pairs) :
+            return
+        n, c = self.model.n, len(pairs)
+        context.add_user_cuts(cuts = [self.pair(ind = [n + k, s], val = [1.0, -1.0])
+                                      for k, s in zip(pairs.tolist(), self.model.server[pairs].tolist())],
+                              senses = "L"*c, rhs = [0.0]*c, cutmanagement = [self.purge]*c, local = [False]*c)
+        self.cuts += c
+
+
+#-----------------------------------------------------------------------------
+# Solver
+#-----------------------------------------------------------------------------
+
+# model built with formulation "aggregated" ; returns the Result (values in
+# the layout of the model) and the number of linking rows added
+def solve_lazy(model, backend = "cplex", eps = 1e-6, max_cuts = None, max_rounds = 50, **options) :
+
+    if model.formulation != "aggregated" :
+        raise ValueError("lazy linking rows start from the aggregated formulation")
+    max_cuts = max_cuts or 10*model.n
+
+    if backend == "cplex" and not options.get("relax") :
+        callback = LinkingCallback(model, eps, max_cuts, options.pop("progress", None))
+        result = solve(model, backend, callback = callback, **options)
+        return result, callback.cuts
+
+    start = time.time()
+    lp_options = {k: v for k, v in options.items() if k in ("time_limit", "threads", "log")}
+    added = np.zeros(0, dtype = int)
+    work = model
+    for _ in range(max_rounds) :
+        lp = solve(work, backend, relax = True, **lp_options)
+        if lp.values is None :
+            break
+        pairs = violated(model, lp.values, eps, max_cuts)
+        if not len(pairs) :
+            break
+        added = np.concatenate((added, pairs))
+        work = add_linking(model, added)
+
+    if options.get("relax") :
+        return lp._replace(solve_time = time.time() - start), len(added)
+    result = solve(work, backend, **options)
+    return result._replace(solve_time = time.time() - start), len(added)
@@ -0,0 +1,56 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+
+#-----------------------------------------------------------------------------
+# Server network
+#-----------------------------------------------------------------------------
+
+# Random undirected network on n nodes, stored as the upper triangle of a CSR
+# matrix : each link (j, jj), j < jj, exists with probability 1 - th and has an
+# integer weight in [low, high]. Rows are drawn by blocks so that memory stays
+# bounded by the number of links and not by n^2.
+def random_network(n, th = 0.2, seed = None, low = 1, high = 100, block_size = 10**7) :
+
+    rng = np.random.default_rng(seed)
+    block = max(1, block_size//max(n, 1))
+    rows, cols = [], []
+    for start in range(0, n, block) :
+        stop = min(n, start + block)
+        r, c = np.nonzero(rng.random((stop - start, n)) >= th)
+        r += start
+        upper = c > r
+        rows.append(r[upper])
+        cols.append(c[upper])
+
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype = int)
+    cols = np.concatenate(cols) if cols else np.zeros(0, dtype = int)
+    weights = rng.integers(low, high + 1, size = len(rows)).astype(float)
+    return csr_matrix((weights, (rows, cols)), shape = (n, n))
+
+
+#-----------------------------------------------------------------------------
+# Distances from the clients' nodes
+#-----------------------------------------------------------------------------
+
+# q only reads the distances from the nodes where the clients' data are, so
+# Dijkstra is run from the distinct client nodes only. Returns the distance
+# rows of those sources and, for every client, the index of its row. With a
+# distance_cache.DistanceCache the rows are read from / written to disk.
+def client_distances(net, nodes, cache = None) :
+
+    sources, inverse = np.unique(np.asarray(nodes), return_inverse = True)
+    if cache is not None :
+        return cache.distances(net, sources), inverse
+    dist = dijkstra(net, directed = False, indices = sources)
+    return dist.reshape(len(sources), -1), inverse
+
+
+# Total unitary transport gain between Client i and Facility j, q_{i,j},
+# where the transport cost is the distance between the client's node and j
+def transport_gain(cost, demand, dist, inverse) :
+
+    cost = np.asarray(cost, dtype = float)
+    demand = np.asarray(demand, dtype = float)
+    return (cost[None, :] + dist[inverse])*demand[:, None]
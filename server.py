@@ -0,0 +1,252 @@
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import socket
+
+from instance import Instance
+
+
+#-----------------------------------------------------------------------------
+# Local solve server
+#-----------------------------------------------------------------------------
+
+# Other services send instances as arrays and get structured solutions back,
+# without starting an interpreter, importing the solvers and generating data
+# on every call. The protocol is JSON lines, over a Unix socket or a localhost
+# TCP port. A request is
+#   {"id": .., "variant": "compute", "capacity": [..], "cost": [..],
+#    "demand": [..], "q": [[..]], "tol": [..], "gain": [..],
+#    "backend": "highs", "options": {"time_limit": 10, ...}, "model": {...}}
+# (variant, see instance.VARIANTS ; tol and gain optional ; options go to the
+# backend and model to Instance.model) and the server answers with the lines
+#   {"id": .., "event": "queued", "position": ..}
+#   {"id": .., "event": "started"}
+#   {"id": .., "event": "result", "cached": false, "status": .., "objective": ..,
+#    "bound": .., "gap": .., "x": [..], "flows": [[i, j, y_{i,j}], ..], ...}
+# or {"id": .., "event": "error", "message": ..}.
+#
+# Requests wait in a queue and are solved by a pool of worker processes that
+# import the solvers once when they start. Results are cached by a hash of
+# the instance, the backend and the options : an identical request is
+# answered at once, and one that arrives while the same instance is being
+# solved waits for that solve instead of starting another one.
+
+
+def request_key(request) :
+
+    h = hashlib.sha256()
+    h.update(str(request["variant"]).encode())
+    for name in ("capacity", "cost", "demand", "q", "tol", "gain") :
+        h.update(name.encode())
+        if request.get(name) is not None :
+            a = np.asarray(request[name], dtype = np.float64)
+            h.update(np.array(a.shape, dtype = np.int64).tobytes())
+            h.update(a.tobytes())
+    h.update(json.dumps([request.get("backend", "highs"), request.get("options", {}), request.get("model", {})],
+                        sort_keys = True).encode())
+    return h.hexdigest()
+
+
+#-----------------------------------------------------------------------------
+# Workers
+#-----------------------------------------------------------------------------
+
+# Warm start of a worker : the solvers are imported before the first request
+def _init_worker() :
+    import scipy.optimize
+    import backends
+    try :
+        import cplex
+    except ImportError :
+        pass
+
+
+def solve_request(request) :
+    from backends import solve
+    from solution import Solution
+
+    m = len(request["demand"])
+    instance = Instance(request["variant"], request["capacity"], request["cost"], request["demand"],
+                        request.get("gain") or np.zeros(m),
+                        request.get("tol") if request.get("tol") is not None else np.ones(m),
+                        request["q"])
+    model = instance.model(**request.get("model", {}))
+    result = solve(model, request.get("backend", "highs"), **request.get("options", {}))
+
+    answer = {"status": result.status, "objective": result.objective, "bound": result.bound, "gap": result.gap,
+              "solve_time": result.solve_time, "nodes": result.nodes}
+    if result.values is not None :
+        sol = Solution.from_model(model, result)
+        i, j = np.nonzero(sol.y > 1e-9)
+        answer.update(x = sol.x.tolist(),
+                      flows = np.column_stack((i, j, sol.y[i, j])).tolist(),
+                      utilization = sol.utilization.tolist(),
+                      demand_treated = float(sol.demand_treated))
+    return answer
+
+
+#-----------------------------------------------------------------------------
+# Server
+#-----------------------------------------------------------------------------
+
+class SolveServer :
+
+    def __init__(self, workers = None, cache_size = 1024) :
+        self.workers = workers or os.cpu_count() or 1
+        self.cache_size = cache_size
+        self.cache = OrderedDict()      # key -> answer, least recently used first
+        self.running = {}               # key -> future of the solve in progress
+        self.queue = None
+        self.pool = None
+
+    async def start(self, path = None, host = "127.0.0.1", port = 8765) :
+
+        self.queue = asyncio.Queue()
+        self.pool = ProcessPoolExecutor(max_workers = self.workers, initializer = _init_worker)
+        # the processes are only started with the first tasks
+        for _ in range(self.workers) :
+            self.pool.submit(os.getpid)
+        self.dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+        if path is not None :
+            if os.path.exists(path) :
+                os.remove(path)
+            return await asyncio.start_unix_server(self._client, path = path)
+        return await asyncio.start_server(self._client, host = host, port = port)
+
+    def close(self) :
+        for task in self.dispatchers :
+            task.cancel()
+        self.pool.shutdown(cancel_futures = True)
+
+    async def _dispatch(self) :
+        loop = asyncio.get_running_loop()
+        while True :
+            request, future, started = await self.queue.get()
+            started()
+            try :
+                future.set_result(await loop.run_in_executor(self.pool, solve_request, request))
+            except Exception as e :
+                future.set_exception(e)
+            finally :
+                self.queue.task_done()
+
+    async def solve(self, request, send) :
+
+        key = request_key(request)
+        if key in self.cache :
+            self.cache.move_to_end(key)
+            await send(dict(self.cache[key], event = "result", cached = True))
+            return
+
+        future = self.running.get(key)
+        if future is None :
+            future = asyncio.get_running_loop().create_future()
+            self.running[key] = future
+            await send({"event": "queued", "position": self.queue.qsize()})
+            self.queue.put_nowait((request, future, lambda : asyncio.ensure_future(send({"event": "started"}))))
+        else :
+            await send({"event": "queued", "position": None, "coalesced": True})
+
+        try :
+            answer = await asyncio.shield(future)
+        finally :
+            if future.done() :
+                self.running.pop(key, None)
+        self.cache[key] = answer
+        if len(self.cache) > self.cache_size :
+            self.cache.popitem(last = False)
+        await send(dict(answer, event = "result", cached = False))
+
+    async def _client(self, reader, writer) :
+
+        lock = asyncio.Lock()
+        tasks = set()
+        async def reply(request_id, message) :
+            async with lock :
+                writer.write((json.dumps(dict(message, id = request_id), default = float) + "\n").encode())
+                await writer.drain()
+
+        async def handle(request) :
+            request_id = request.get("id")
+            try :
+                await self.solve(request, lambda message : reply(request_id, message))
+            except Exception as e :
+                await reply(request_id, {"event": "error", "message": repr(e)})
+
+        try :
+            while True :
+                line = await reader.readline()
+                if not line :
+                    break
+                try :
+                    request = json.loads(line)
+                except ValueError as e :
+                    await reply(None, {"event": "error", "message": "invalid JSON: " + str(e)})
+                    continue
+                task = asyncio.create_task(handle(request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks :
+                await asyncio.wait(tasks)
+        finally :
+            writer.close()
+
+
+#-----------------------------------------------------------------------------
+# Client
+#-----------------------------------------------------------------------------
+
+# Blocking client for one request : sends it and returns the result line
+# (raises RuntimeError on an error line)
+def request(payload, path = None, host = "127.0.0.1", port = 8765) :
+
+    if path is not None :
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(path)
+    else :
+        conn = socket.create_connection((host, port))
+    with conn, conn.makefile("rw") as f :
+        f.write(json.dumps(payload, default = lambda a : np.asarray(a).tolist()) + "\n")
+        f.flush()
+        for line in f :
+            message = json.loads(line)
+            if message["event"] == "result" :
+                return message
+            if message["event"] == "error" :
+                raise RuntimeError(message["message"])
+    raise RuntimeError("connection closed before the result")
+
+
+def main(argv = None) :
+
+    parser = argparse.ArgumentParser(description = "Local facility location solve server")
+    parser.add_argument("--socket", default = None, help = "Unix socket path (default: localhost TCP)")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8765)
+    parser.add_argument("--workers", type = int, default = None)
+    parser.add_argument("--cache-size", type = int, default = 1024)
+    args = parser.parse_args(argv)
+
+    async def serve() :
+        server = SolveServer(args.workers, args.cache_size)
+        listener = await server.start(args.socket, args.host, args.port)
+        print("serving on", args.socket or (args.host + ":" + str(args.port)), "with", server.workers, "workers")
+        try :
+            async with listener :
+                await listener.serve_forever()
+        finally :
+            server.close()
+
+    try :
+        asyncio.run(serve())
+    except KeyboardInterrupt :
+        pass
+
+
+if __name__ == "__main__" :
+    main()
@@ -0,0 +1,119 @@
+import numpy as np
+from functools import cached_property
+
+from sparse_model import dense_values
+
+
+#-----------------------------------------------------------------------------
+# Solution of a facility location model
+#-----------------------------------------------------------------------------
+
+# The column values are read once from the solver ; x, y and distr are views
+# or single vectorized expressions over them. Values are in the layout of the
+# full model (x_{j} then y_{i,j} at n + i*n + j).
+
+class Solution :
+
+    def __init__(self, values, demand, capacity, objective = None, bound = None, status = None) :
+        self.values = np.asarray(values, dtype = float)
+        self.demand = np.asarray(demand, dtype = float)
+        self.capacity = np.asarray(capacity, dtype = float)
+        self.objective = objective
+        self.bound = bound
+        self.status = status
+        self.n, self.m = len(self.capacity), len(self.demand)
+
+    @classmethod
+    def from_result(cls, result, demand, capacity) :
+        if result.values is None :
+            raise ValueError("no solution to read, solver status: " + str(result.status))
+        return cls(result.values, demand, capacity, result.objective, result.bound, result.status)
+
+    # For a model with pruned columns (sparse_model.build_model with a mask)
+    @classmethod
+    def from_model(cls, model, result) :
+        if result.values is None :
+            raise ValueError("no solution to read, solver status: " + str(result.status))
+        return cls(dense_values(model, result.values), model.demand, model.capacity,
+                   result.objective, result.bound, result.status)
+
+
+    ## Arrays
+
+    # Whether or not server j is used, x_{j}
+    @property
+    def x(self) :
+        return self.values[:self.n]
+
+    # Rate of client's i demand fullfilled by server j, y_{i,j}
+    @property
+    def y(self) :
+        return self.values[self.n:].reshape(self.m, self.n)
+
+    # Demand of client i treated by server j, d_{i}*y_{i,j}
+    @cached_property
+    def distr(self) :
+        return self.y*self.demand[:, None]
+
+    @cached_property
+    def opened(self) :
+        return self.x > 0.5
+
+    # Share of the capacity of every server that is used
+    @cached_property
+    def utilization(self) :
+        return self.distr.sum(axis = 0)/self.capacity
+
+    # Share of the demand of every client that is treated
+    @cached_property
+    def coverage(self) :
+        return self.y.sum(axis = 1)
+
+    @property
+    def capacity_used(self) :
+        return self.distr.sum()/self.capacity.sum()
+
+    @property
+    def demand_treated(self) :
+        return self.distr.sum()/self.demand.sum()
+
+
+    ## Save / load
+
+    def save(self, path) :
+        np.savez(path, values = self.values, demand = self.demand, capacity = self.capacity,
+                 objective = np.nan if self.objective is None else self.objective,
+                 bound = np.nan if self.bound is None else self.bound,
+                 status = "" if self.status is None else self.status)
+
+    @classmethod
+    def load(cls, path) :
+        with np.load(path) as f :
+            objective, bound = float(f["objective"]), float(f["bound"])
+            return cls(f["values"], f["demand"], f["capacity"],
+                       None if np.isnan(objective) else objective,
+                       None if np.isnan(bound) else bound,
+                       str(f["status"]) or None)
+
+
+    ## Text report, built line by line only when it is read
+
+    def report(self, server = "Server", closed = True, clients = True, sign = 1) :
+
+        for j in range(self.n) :
+            if not self.opened[j] :
+                if closed :
+                    yield server + " " + str(j+1) + " is shutdown"
+                continue
+            yield server + " " + str(j+1) + " uses " + str(round(100*self.utilization[j], 1)) + "% of its capacity"
+            if clients :
+                for i in np.flatnonzero(self.y[:, j] > 0) :
+                    yield "   - Client " + str(i+1) + " which has " + str(round(100*self.y[i, j], 1)) + "% of its demand treated by this server"
+        yield ""
+        yield str(round(100*self.capacity_used, 1)) + "% capacity used"
+        yield str(round(100*self.demand_treated, 1)) + "% demand treated"
+        if self.objective is not None :
+            yield "Total : " + str(round(sign*self.objective, 2))
+
+    def __str__(self) :
+        return "\n".join(self.report())
@@ -0,0 +1,89 @@
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+
+#-----------------------------------------------------------------------------
+# Solve trace
+#-----------------------------------------------------------------------------
+
+# Structured trace of a run, one JSON object per line :
+#   {"event": "phase",    "t": .., "name": "build", "duration": ..}
+#   {"event": "progress", "t": .., "objective": .., "bound": .., "gap": .., "nodes": ..}
+#   {"event": "result",   "t": .., "backend": .., "status": .., "objective": .., ...}
+# plus any event written with Tracer.event. t is the time in seconds since
+# the tracer was created. Non-finite numbers (no bound yet, infinite gap) are
+# written as null, so that every line stays valid JSON.
+#
+# Tracer.progress has the signature of the progress option of the backends.
+# To keep the overhead low while it stays on, a progress line is written only
+# when the incumbent improves or when min_interval seconds went by since the
+# last one.
+
+def _finite(value) :
+    if isinstance(value, dict) :
+        return {k: _finite(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)) :
+        return [_finite(v) for v in value]
+    if hasattr(value, "tolist") :
+        return _finite(value.tolist())
+    if isinstance(value, float) and not math.isfinite(value) :
+        return None
+    return value
+
+
+class Tracer :
+
+    def __init__(self, path, min_interval = 0.5, **context) :
+        self.owned = isinstance(path, str)
+        self.file = open(path, "a") if self.owned else path
+        self.min_interval = min_interval
+        self.context = context
+        self.start = time.time()
+        self.last = -float("inf")
+        self.incumbent = None
+        self.lock = threading.Lock()
+        if context :
+            self.event("start", **context)
+
+    def event(self, event, **fields) :
+        line = json.dumps(_finite(dict({"event": event, "t": round(time.time() - self.start, 6)}, **fields)),
+                          default = float, allow_nan = False)
+        with self.lock :
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    @contextmanager
+    def phase(self, name) :
+        start = time.time()
+        try :
+            yield
+        finally :
+            self.event("phase", name = name, duration = time.time() - start)
+
+    def progress(self, objective, bound, nodes) :
+        now = time.time()
+        improved = objective is not None and (self.incumbent is None or objective != self.incumbent)
+        if not improved and now - self.last < self.min_interval :
+            return
+        self.last, self.incumbent = now, objective
+        gap = None
+        if objective is not None and bound is not None :
+            gap = abs(objective - bound)/max(1e-10, abs(objective))
+        self.event("progress", objective = objective, bound = bound, gap = gap, nodes = nodes)
+
+    def result(self, result) :
+        self.event("result", backend = result.backend, status = result.status, objective = result.objective,
+                   bound = result.bound, gap = result.gap, nodes = result.nodes, solve_time = result.solve_time)
+
+    def close(self) :
+        if self.owned :
+            self.file.close()
+
+    def __enter__(self) :
+        return self
+
+    def __exit__(self, *exc) :
+        self.close()
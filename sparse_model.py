@@ -0,0 +1,168 @@
+import numpy as np
+from collections import namedtuple
+from scipy.sparse import csr_matrix
+
+
+#-----------------------------------------------------------------------------
+# Sparse model of the facility location problem
+#-----------------------------------------------------------------------------
+
+# The whole model is kept as flat NumPy arrays so that it can be built in one
+# pass and handed to a solver in bulk instead of one CPLEX call per row.
+#
+# Columns : x_{j} for the n servers, then one y_{i,j} per (client, server) pair
+# Rows    : n capacity rows, then the fulfilment rows of the m clients (m rows,
+#           or 2m when the demand is only satisfied up to a tolerance), then
+#           one linking row y_{i,j} - x_{j} <= 0 per pair for weak/strong models
+
+Model = namedtuple('Model', ('n',            # Number of servers
+                             'm',            # Number of clients
+                             'obj',          # Objective coefficients of every column
+                             'lb',           # Lower bounds of every column
+                             'ub',           # Upper bounds of every column
+                             'types',        # "B" (or "I") for x_{j}, "C" for y_{i,j}
+                             'A',            # Constraint matrix (CSR)
+                             'senses',       # "L", "E" or "G" for every row
+                             'rhs',          # Right hand side of every row
+                             'client',       # Client i of every y column
+                             'server',       # Server j of every y column
+                             'demand',       # d_{i}
+                             'capacity',     # S_{j}
+                             'formulation',  # "weak", "aggregated" or "strong"
+                             'fulfil',       # "L", "E" or "tol"
+                             'tol'))         # alpha_{i}, only used when fulfil is "tol"
+
+
+# Fulfilment rule of the compute variants : if all demands can be fullfilled
+# they are, and if not the client's demand is satisfied with a certain tolerance
+def fulfil_rule(demand, capacity) :
+    return "E" if np.sum(demand) <= np.sum(capacity) else "tol"
+
+
+#-----------------------------------------------------------------------------
+# Build the model
+#-----------------------------------------------------------------------------
+
+# formulation "weak"       : sum_i d_{i}*y_{i,j} <= S_{j}  and  y_{i,j} <= x_{j}
+#             "aggregated" : sum_i d_{i}*y_{i,j} <= S_{j}*x_{j}
+#             "strong"     : both the aggregated capacity and the linking rows
+# fulfil      "L"          : sum_j y_{i,j} <= 1
+#             "E"          : sum_j y_{i,j} == 1
+#             "tol"        : alpha_{i} <= sum_j y_{i,j} <= 1
+# mask        optional m*n boolean matrix of the (i, j) pairs that get a y column
+# x_ub        optional upper bound of every x_{j} ; x_{j} is an integer "number
+#             of servers opened" instead of a binary when it is above 1
+def build_model(capacity, cost, demand, obj_y, formulation = "weak", fulfil = "L", tol = None, mask = None,
+                x_ub = None) :
+
+    capacity = np.asarray(capacity, dtype = float)
+    cost = np.asarray(cost, dtype = float)
+    demand = np.asarray(demand, dtype = float)
+    obj_y = np.asarray(obj_y, dtype = float)
+    n, m = len(capacity), len(demand)
+
+    if formulation not in ("weak", "aggregated", "strong") :
+        raise ValueError("unknown formulation: " + str(formulation))
+    if fulfil not in ("L", "E", "tol") :
+        raise ValueError("unknown fulfil rule: " + str(fulfil))
+    if fulfil == "tol" :
+        if tol is None :
+            raise ValueError("fulfil rule 'tol' needs the clients' tolerances")
+        tol = np.asarray(tol, dtype = float)
+
+    ## Columns
+
+    if mask is None :
+        client = np.repeat(np.arange(m), n)
+        server = np.tile(np.arange(n), m)
+    else :
+        client, server = np.nonzero(mask)
+    k = len(client)
+    col_y = n + np.arange(k)
+
+    obj = np.concatenate((cost, obj_y[client, server]))
+    lb = np.zeros(n + k)
+    ub = np.ones(n + k)
+    types = np.full(n + k, "C")
+    types[:n] = "B"
+    if x_ub is not None :
+        ub[:n] = x_ub
+        types[:n] = np.where(ub[:n] > 1, "I", "B")
+
+    ## Rows, as COO triplets
+
+    rows, cols, vals, senses, rhs = [], [], [], [], []
+
+    # Facility j cannot supply more than S_{j} (or x_{j}*S_{j})
+    rows.append(server)
+    cols.append(col_y)
+    vals.append(demand[client])
+    senses.append(np.full(n, "L"))
+    if formulation == "weak" :
+        rhs.append(capacity)
+    else :
+        rows.append(np.arange(n))
+        cols.append(np.arange(n))
+        vals.append(-capacity)
+        rhs.append(np.zeros(n))
+
+    # Demands are fullfiled
+    r = n
+    rows.append(r + client)
+    cols.append(col_y)
+    vals.append(np.ones(k))
+    senses.append(np.full(m, "E" if fulfil == "E" else "L"))
+    rhs.append(np.ones(m))
+    r += m
+    if fulfil == "tol" :
+        rows.append(r + client)
+        cols.append(col_y)
+        vals.append(np.ones(k))
+        senses.append(np.full(m, "G"))
+        rhs.append(tol)
+        r += m
+
+    # No supply can come from a closed facility
+    if formulation != "aggregated" :
+        rows += [r + np.arange(k), r + np.arange(k)]
+        cols += [col_y, server]
+        vals += [np.ones(k), -np.ones(k)]
+        senses.append(np.full(k, "L"))
+        rhs.append(np.zeros(k))
+        r += k
+
+    A = csr_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                   shape = (r, n + k))
+
+    return Model(n, m, obj, lb, ub, types, A, np.concatenate(senses), np.concatenate(rhs),
+                 client, server, demand, capacity, formulation, fulfil, tol)
+
+
+# Values of a solved model laid out as if every (i, j) pair had a y column :
+# x_{j} first, then y_{i,j} at n + i*n + j
+def dense_values(model, values) :
+
+    dense = np.zeros(model.n + model.m*model.n)
+    dense[:model.n] = values[:model.n]
+    dense[model.n + model.client*model.n + model.server] = values[model.n:]
+    return dense
+
+
+#-----------------------------------------------------------------------------
+# Load the model into CPLEX
+#-----------------------------------------------------------------------------
+
+# One call for the columns, one for the rows and one for all the coefficients
+def load_cplex(model) :
+    import cplex
+
+    flp = cplex.Cplex()
+    flp.variables.add(obj = model.obj.tolist(),
+                      lb = np.maximum(model.lb, -cplex.infinity).tolist(),
+                      ub = np.minimum(model.ub, cplex.infinity).tolist(),
+                      types = "".join(model.types))
+    flp.linear_constraints.add(senses = "".join(model.senses),
+                               rhs = model.rhs.tolist())
+    coo = model.A.tocoo()
+    flp.linear_constraints.set_coefficients(list(zip(coo.row.tolist(), coo.col.tolist(), coo.data.tolist())))
+    return flp
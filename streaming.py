@@ -0,0 +1,310 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+
+from sparse_model import build_model, fulfil_rule, dense_values
+from network import client_distances
+from backends import solve
+
+
+#-----------------------------------------------------------------------------
+# Online assignment of a stream of clients
+#-----------------------------------------------------------------------------
+
+# Clients (compute jobs) arrive and leave one at a time. As in
+# adaptation_compute.py / with_network.py, client i on server j costs
+#   q_{i,j} = (c_{j} + dist(node_{i}, j))*d_{i}       (dist = 0 without a network)
+# and opening server j costs c_{j}, so the servers a client prefers only
+# depend on its node : there is one pair of heaps per node, over its k
+# cheapest servers by unitary cost c_{j} + dist(node, j), one for the opened
+# servers with capacity left and one for the closed servers. An arriving
+# client takes the cheapest of the two tops (a closed server is charged its
+# opening cost spread over what the client would put on it), as much as the
+# server can, and goes on until its demand is served : O(log n) per server it
+# uses. When the k servers of a node are all full they are extended to its 2k
+# cheapest ones, as in candidates.py. If less than alpha_{i} of the demand can
+# be served the client is rejected.
+#
+# Heap entries are deleted lazily : a server that gets full or changes state
+# stays in its heaps until it reaches the top, where it is dropped. Every heap
+# keeps the set of the servers it holds, so that when a server is opened,
+# closed or gets capacity back it is only pushed again in the heaps of its
+# nodes that dropped it.
+#
+# The cost of the online solution is compared with the one of the last full
+# optimization, per unit of demand served. When it drifts past (1 + gap)
+# times it, the model of the clients present is solved again in a background
+# process, and its assignment is adopted once it is ready : the clients that
+# arrived in the meantime are assigned again online on top of it.
+
+def _reoptimize(model, backend, options) :
+    return solve(model, backend, **options)
+
+
+class StreamingAssigner :
+
+    def __init__(self, capacity, cost, net = None, cache = None, k = 32, gap = 0.05, warmup = 100,
+                 backend = "highs", background = True, **options) :
+
+        self.capacity = np.asarray(capacity, dtype = float)
+        self.cost = np.asarray(cost, dtype = float)
+        self.n = len(self.capacity)
+        self.net, self.cache, self.k = net, cache, k
+        self.gap, self.warmup = gap, warmup
+        self.backend, self.options = backend, options
+
+        self.residual = self.capacity.tolist()
+        self.opened = [False]*self.n
+        self.unit = {}          # node -> unitary cost of every server
+        self.heaps = {}         # node -> (heap of the opened servers, heap of the closed servers, their sets)
+        self.candidates = {}    # node -> number of cheapest servers in its heaps
+        self.members = [set() for _ in range(self.n)]   # server -> nodes it is a candidate of
+        self.clients = {}       # key -> [demand, tol, node, [(server, amount)]]
+
+        self.open_cost = 0.0
+        self.flow_cost = 0.0
+        self.served = 0.0
+        self.reference = None   # cost per unit of demand of the last optimization
+        self.evicted = []       # clients that no longer fit after an optimization was adopted
+        self.reoptimizations = 0
+
+        self.pool = ProcessPoolExecutor(max_workers = 1) if background else None
+        self.pending = None
+
+
+    ## Heaps
+
+    def _unit(self, node) :
+        if node not in self.unit :
+            if self.net is None :
+                self.unit[node] = self.cost.tolist()
+            else :
+                dist, _ = client_distances(self.net, [node], self.cache)
+                self.unit[node] = (self.cost + dist[0]).tolist()
+        return self.unit[node]
+
+    # Heaps of the size cheapest servers of node
+    def _build(self, node, size) :
+        unit = np.array(self._unit(node))
+        order = np.argsort(unit, kind = "stable")[:size]
+        order = order[np.isfinite(unit[order])].tolist()
+        unit, eps = unit.tolist(), 1e-9
+        opened = [(unit[j], j) for j in order if self.opened[j] and self.residual[j] > eps]
+        closed = [(unit[j], j) for j in order if not self.opened[j]]
+        heapq.heapify(opened)
+        heapq.heapify(closed)
+        for j in order :
+            self.members[j].add(node)
+        self.heaps[node] = (opened, closed, {j for _, j in opened}, {j for _, j in closed})
+        self.candidates[node] = size
+        return self.heaps[node]
+
+    def _heaps(self, node) :
+        if node not in self.heaps :
+            return self._build(node, self.k)
+        return self.heaps[node]
+
+    # Server j was opened, closed or got capacity back : push it again in the
+    # heaps of its nodes that dropped it
+    def _touch(self, j) :
+        if self.opened[j] and self.residual[j] <= 1e-9 :
+            return
+        k = 0 if self.opened[j] else 1
+        for node in self.members[j] :
+            heaps = self.heaps[node]
+            if j not in heaps[k + 2] :
+                heapq.heappush(heaps[k], (self.unit[node][j], j))
+                heaps[k + 2].add(j)
+
+    def _top(self, heaps, k) :
+        heap, inside = heaps[k], heaps[k + 2]
+        while heap :
+            u, j = heap[0]
+            if self.opened[j] == (k == 0) and (k == 1 or self.residual[j] > 1e-9) :
+                return u, j
+            heapq.heappop(heap)
+            inside.discard(j)
+        return None
+
+
+    ## Assignment
+
+    def _assign(self, demand, tol, node) :
+
+        heaps = self._heaps(node)
+        left, flows, new = demand, [], []
+        while left > 1e-9 :
+            o, c = self._top(heaps, 0), self._top(heaps, 1)
+            if o is None and c is None :
+                if self.candidates[node] >= self.n :
+                    break
+                heaps = self._build(node, 2*self.candidates[node])
+                continue
+            if c is not None and o is not None :
+                spread = self.cost[c[1]]/max(1e-12, min(left, self.residual[c[1]]))
+                c = c if c[0] + spread < o[0] else None
+            if c is not None :
+                u, j = c
+                self.opened[j] = True
+                self.open_cost += self.cost[j]
+                new.append(j)
+            else :
+                u, j = o
+            amount = min(left, self.residual[j])
+            self.residual[j] -= amount
+            self.flow_cost += u*amount
+            left -= amount
+            flows.append((j, amount))
+            if j in new :
+                self._touch(j)
+
+        if demand - left < tol*demand - 1e-9 :
+            self._release(flows, node)
+            for j in new :
+                if self.opened[j] and self.residual[j] >= self.capacity[j] - 1e-9 :
+                    self._close(j)
+            return None
+        self.served += demand - left
+        return flows
+
+    def _release(self, flows, node) :
+        unit = self._unit(node)
+        for j, amount in flows :
+            full = self.residual[j] <= 1e-9
+            self.residual[j] += amount
+            self.flow_cost -= unit[j]*amount
+            if full :
+                self._touch(j)
+
+    def _close(self, j) :
+        self.opened[j] = False
+        self.open_cost -= self.cost[j]
+        self._touch(j)
+
+    # Returns the (server, amount of demand) pairs given to the client, or
+    # None if it is rejected
+    def arrive(self, key, demand, tol = 0.0, node = None) :
+
+        self._poll()
+        flows = self._assign(float(demand), float(tol), node)
+        if flows is not None :
+            self.clients[key] = [float(demand), float(tol), node, flows]
+            self._drift()
+        return flows
+
+    def depart(self, key) :
+
+        self._poll()
+        demand, tol, node, flows = self.clients.pop(key)
+        self._release(flows, node)
+        self.served -= sum(a for _, a in flows)
+        for j, _ in flows :
+            if self.opened[j] and self.residual[j] >= self.capacity[j] - 1e-9 :
+                self._close(j)
+        self._drift()
+
+    # Events ("arrive", key, demand, tol, node) and ("depart", key) ; yields
+    # (key, flows) for every arrival
+    def run(self, events) :
+        for event in events :
+            if event[0] == "arrive" :
+                yield event[1], self.arrive(*event[1:])
+            else :
+                self.depart(event[1])
+
+    @property
+    def total_cost(self) :
+        return self.open_cost + self.flow_cost
+
+
+    ## Re-optimization
+
+    def _drift(self) :
+        if self.pending is not None or not self.clients :
+            return
+        if self.reference is None :
+            if len(self.clients) >= self.warmup :
+                self.reoptimize()
+        elif self.total_cost > (1 + self.gap)*self.reference*self.served :
+            self.reoptimize()
+
+    # Full model of the clients present, solved in the background process (or
+    # right away without one) ; with wait, the result is adopted before
+    # returning
+    def reoptimize(self, wait = False) :
+
+        keys = list(self.clients)
+        records = [self.clients[k] for k in keys]
+        demand = np.array([r[0] for r in records])
+        tol = np.array([r[1] for r in records])
+        unit = np.array([self._unit(r[2]) for r in records])
+        obj_y = unit*demand[:, None]
+        model = build_model(self.capacity, self.cost, demand, obj_y, "aggregated", fulfil_rule(demand, self.capacity),
+                            tol, mask = np.isfinite(obj_y) if not np.all(np.isfinite(obj_y)) else None)
+
+        snapshot = (keys, records, model)
+        if self.pool is None :
+            self.pending = (snapshot, _reoptimize(model, self.backend, self.options))
+        else :
+            self.pending = (snapshot, self.pool.submit(_reoptimize, model, self.backend, self.options))
+        if wait or self.pool is None :
+            self._poll(wait = True)
+
+    def _poll(self, wait = False) :
+
+        if self.pending is None :
+            return
+        snapshot, result = self.pending
+        if self.pool is not None :
+            if not (wait or result.done()) :
+                return
+            result = result.result()
+        self.pending = None
+        self.reoptimizations += 1
+        if result.values is not None :
+            self._adopt(snapshot, result)
+
+    def _adopt(self, snapshot, result) :
+
+        keys, records, model = snapshot
+        values = dense_values(model, result.values)
+        x = values[:self.n] > 0.5
+        y = values[self.n:].reshape(len(keys), self.n)
+
+        self.residual = self.capacity.tolist()
+        self.opened = x.tolist()
+        self.heaps, self.candidates = {}, {}
+        self.members = [set() for _ in range(self.n)]
+        self.open_cost = float(self.cost[x].sum())
+        self.flow_cost = 0.0
+        self.served = 0.0
+
+        ## Clients of the snapshot still present : flows of the optimum
+        done = set()
+        for i, key in enumerate(keys) :
+            if self.clients.get(key) is not records[i] :
+                continue
+            demand, _, node, _ = records[i]
+            unit = self._unit(node)
+            flows = [(int(j), float(y[i, j]*demand)) for j in np.flatnonzero(y[i] > 1e-9)]
+            for j, amount in flows :
+                self.residual[j] -= amount
+                self.flow_cost += unit[j]*amount
+            self.served += sum(a for _, a in flows)
+            records[i][3] = flows
+            done.add(key)
+        self.reference = result.objective/max(1e-10, (y*model.demand[:, None]).sum())
+
+        ## Clients that arrived since : assigned again online
+        for key in [k for k in self.clients if k not in done] :
+            demand, tol, node, _ = self.clients[key]
+            flows = self._assign(demand, tol, node)
+            if flows is None :
+                del self.clients[key]
+                self.evicted.append(key)
+            else :
+                self.clients[key][3] = flows
+
+    def close(self) :
+        if self.pool is not None :
+            self.pool.shutdown()
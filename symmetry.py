@@ -0,0 +1,108 @@
+import numpy as np
+from collections import namedtuple
+from scipy.sparse import csr_matrix, vstack
+
+from sparse_model import build_model
+from backends import solve
+
+
+#-----------------------------------------------------------------------------
+# Server types
+#-----------------------------------------------------------------------------
+
+# Servers with the same capacity, the same cost and the same column of q are
+# interchangeable : any solution stays a solution when two of them swap their
+# roles, and branch-and-bound explores all those equivalent nodes.
+
+ServerTypes = namedtuple('ServerTypes', ('type',       # Type of every server
+                                         'capacity',   # S_{t}
+                                         'cost',       # c_{t}
+                                         'count',      # Number of servers of every type
+                                         'obj_y'))     # Column of obj_y of every type
+
+
+def server_types(capacity, cost, obj_y) :
+
+    capacity = np.asarray(capacity, dtype = float)
+    cost = np.asarray(cost, dtype = float)
+    obj_y = np.asarray(obj_y, dtype = float)
+    keys = np.column_stack((capacity, cost, obj_y.T))
+    _, first, type_, count = np.unique(keys, axis = 0, return_index = True,
+                                       return_inverse = True, return_counts = True)
+    return ServerTypes(type_.reshape(-1), capacity[first], cost[first], count, obj_y[:, first])
+
+
+#-----------------------------------------------------------------------------
+# Model with one "number opened" variable per type
+#-----------------------------------------------------------------------------
+
+# z_{t} in {0, .., count_{t}} servers of type t are opened and y_{i,t} is the
+# rate of client i treated by all of them :
+#   sum_i d_{i}*y_{i,t} <= S_{t}*z_{t}   (and y_{i,t} <= z_{t} for weak models)
+# Splitting y_{i,t} evenly over the z_{t} opened servers gives back a solution
+# of the original model with the same cost, so the reduction is exact.
+def type_model(types, demand, formulation = "weak", fulfil = "L", tol = None) :
+
+    return build_model(types.capacity, types.cost, demand, types.obj_y,
+                       formulation = "aggregated" if formulation == "aggregated" else "strong",
+                       fulfil = fulfil, tol = tol, x_ub = types.count)
+
+
+# Values of the type model (z then y_{i,t}) to the layout of the original
+# model : the first z_{t} servers of every type are opened
+def expand(types, values) :
+
+    t = len(types.count)
+    n = len(types.type)
+    z = np.round(values[:t]).astype(int)
+    y_type = values[t:].reshape(-1, t)
+
+    order = np.argsort(types.type, kind = "stable")
+    rank = np.empty(n, dtype = int)
+    rank[order] = np.arange(n) - np.repeat(np.cumsum(types.count) - types.count, types.count)
+    x = (rank < z[types.type]).astype(float)
+
+    y = y_type[:, types.type]*x[None, :]/np.maximum(z[types.type], 1)[None, :]
+    return np.concatenate((x, y.reshape(-1)))
+
+
+#-----------------------------------------------------------------------------
+# Symmetry breaking on the original model
+#-----------------------------------------------------------------------------
+
+# x_{j} >= x_{j'} for consecutive servers j, j' of the same type : servers of
+# a type are opened in index order
+def add_ordering(model, types) :
+
+    order = np.argsort(types.type, kind = "stable")
+    same = types.type[order[1:]] == types.type[order[:-1]]
+    first, second = order[:-1][same], order[1:][same]
+    k = len(first)
+    rows = csr_matrix((np.concatenate((np.ones(k), -np.ones(k))),
+                       (np.tile(np.arange(k), 2), np.concatenate((first, second)))),
+                      shape = (k, model.A.shape[1]))
+    return model._replace(A = vstack((model.A, rows)).tocsr(),
+                          senses = np.concatenate((model.senses, np.full(k, "G"))),
+                          rhs = np.concatenate((model.rhs, np.zeros(k))))
+
+
+# mode "count" : solve the type model and map it back to the servers
+#      "order" : solve the original model with the ordering rows
+# with log, the number of types and the solver log are printed
+def solve_symmetric(capacity, cost, demand, obj_y, formulation = "weak", fulfil = "L", tol = None,
+                    mode = "count", backend = "cplex", log = False, **options) :
+
+    types = server_types(capacity, cost, obj_y)
+    if log :
+        print(len(capacity), "servers of", len(types.count), "types")
+
+    if mode == "order" :
+        model = build_model(capacity, cost, demand, obj_y, formulation, fulfil, tol)
+        return solve(add_ordering(model, types), backend, log = log, **options)
+    if mode != "count" :
+        raise ValueError("unknown symmetry mode: " + str(mode))
+
+    result = solve(type_model(types, demand, formulation, fulfil, tol), backend, log = log, **options)
+    if result.values is None :
+        return result
+    return result._replace(values = expand(types, result.values))
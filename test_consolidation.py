@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from backends import solve
+from consolidation import solve_consolidation
+from instance import random_instance
+from sparse_model import build_model
+from symmetry import server_types, type_model
+
+
+#-----------------------------------------------------------------------------
+# The consolidation solver against the MIP (HiGHS)
+#-----------------------------------------------------------------------------
+
+def feasible(model, values, tol = 1e-6) :
+
+    viol = model.A @ values - model.rhs
+    viol = np.where(model.senses == "L", viol, np.where(model.senses == "G", -viol, np.abs(viol)))
+    return np.all(viol <= tol) and np.all(values >= model.lb - tol) and np.all(values <= model.ub + tol)
+
+
+def check(model) :
+
+    fast, exact = solve_consolidation(model), solve(model, "highs")
+    assert fast.status == exact.status
+    if exact.status == "optimal" :
+        assert fast.objective == pytest.approx(exact.objective, rel = 1e-6, abs = 1e-6)
+        assert feasible(model, fast.values)
+        assert np.dot(model.obj, fast.values) == pytest.approx(fast.objective)
+
+
+@pytest.mark.parametrize("fulfil", ["L", "E", "tol"])
+@pytest.mark.parametrize("formulation", ["weak", "aggregated"])
+@pytest.mark.parametrize("seed", range(5))
+def test_servers(fulfil, formulation, seed) :
+
+    inst = random_instance("servers", seed = seed)
+    check(build_model(inst.capacity, inst.cost, inst.demand, -inst.q, formulation, fulfil, inst.tol))
+
+
+# Scarce capacity, negative gains and costs : the fill order and the servers
+# opened for free matter
+@pytest.mark.parametrize("fulfil", ["L", "E", "tol"])
+@pytest.mark.parametrize("formulation", ["weak", "aggregated"])
+@pytest.mark.parametrize("seed", range(5))
+def test_scarce(fulfil, formulation, seed) :
+
+    rng = np.random.default_rng(seed)
+    n, m = int(rng.integers(3, 12)), int(rng.integers(5, 30))
+    capacity, cost = rng.integers(1, 6, n), rng.integers(-5, 60, n)
+    demand, gain = rng.integers(1, 8, m), rng.integers(-5, 30, m)
+    q = np.broadcast_to((gain*demand)[:, None], (m, n))
+    check(build_model(capacity, cost, demand, -q, formulation, fulfil, rng.random(m)*0.5))
+
+
+@pytest.mark.parametrize("fulfil", ["L", "E", "tol"])
+@pytest.mark.parametrize("seed", range(5))
+def test_count_types(fulfil, seed) :
+
+    inst = random_instance("servers", seed = seed)
+    types = server_types(inst.capacity, inst.cost, -inst.q)
+    check(type_model(types, inst.demand, "weak", fulfil, inst.tol))
+
+
+def test_rejects_server_dependent_q() :
+
+    inst = random_instance("flp", seed = 0)
+    with pytest.raises(ValueError) :
+        solve_consolidation(build_model(inst.capacity, inst.cost, inst.demand, -inst.q))
@@ -1,8 +1,12 @@
 import numpy as np
-import cplex
-from collections import namedtuple
-import random
-from scipy.sparse.csgraph import shortest_path
+from sparse_model import build_model, fulfil_rule
+from backends import solve
+from solution import Solution
+from instance import random_instance
+from distance_cache import DistanceCache
+from candidates import candidate_mask, solve_pruned
+from aggregation import aggregate_clients, aggregate_rows, disaggregate, raised
+from benders import solve_benders
 import time
 
 
@@ -12,45 +16,19 @@ import time
 
 
 
-# List of servers                                   
-Server = namedtuple('Server', ('num',         # Facility number, j
-                               'capacity',    # Computing capacity of the server (in terms of CPU cores), S_{j}
-                               'cost'))       # Unitary time to compute, c_{j}
-n = random.randint(100,100)
-Servers = ()
-for i in range(n):
-    Servers += (Server(str(i),random.randint(4,8), random.randint(10,50) ),)
-    
-
-# Generates the network
+# Servers (computing capacity S_{j} in CPU cores, unitary time to compute c_{j}),
+# the network (sparse, upper triangle) and clients (node where the data are
+# initially, need of computing power d_{i}, minimum delivery rate alpha_{i}) as
+# arrays, see instance.py. The shortest paths, only from the nodes holding the
+# clients' data, are kept on disk so that the next runs on the same network
+# reuse them ; q_{i,j} is the computing + transport cost.
 th = 0.2
-net = np.zeros(shape = (n,n))
-for j in range(n):
-    for jj in range(j+1,n):
-        p = random.random()
-        if p >= th:
-            net[j,jj] = random.randint(1,100)
-
-dist_matrix = shortest_path(csgraph=net, directed = False)
-    
-
-
-# List of clients
-Client = namedtuple('Client', ('num',           # On which node are the data initially 
-                               'demand',        # Need of computing power of a part of the algorithm (in terms of CPU cores), d_{i}
-                               'gain',
-                               'tol'))          # Minimum delivery rate desired each client, alpha_{i}
-m = random.randint(30,30)
+instance = random_instance("network", n = 100, m = 30, th = th, cache = DistanceCache("distance_cache"))
+n, m = instance.n, instance.m
+Servers, Clients, q, net = instance.servers, instance.clients, instance.q, instance.net
 
 if m > n :
     print("More clients")
-Clients = ()
-for i in range(m):
-    Clients += (Client(str(random.randint(1,n)),random.randint(10,15), random.randint(0,0), random.random()),)
-
-# Total unitary transport gain between Client i and Facility j, q_{i,j}
-q = [[(Servers[j].cost+dist_matrix[int(Clients[i].num)-1][j])*Clients[i].demand for j in range(n)] for i in range(m)]
-q = np.array(q).astype("float")
 
 
 
@@ -62,57 +40,76 @@ q = np.array(q).astype("float")
 # Build the model
 #-----------------------------------------------------------------------------
 
-def facility_location_problem(Servers, Clients, q) :
+def facility_location_problem(Servers, Clients, q, backend = "cplex", k = None, aggregate = False, tol_step = None,
+                              decompose = False, trace = None, deadline = None, gap = None) :
 
-    ## Create CPO model
-    flp = cplex.Cplex()
-    
-    
-    ## Create the decisions variables
-    
-    # Whether or not server j must be used, x_{j}
-    x = list(flp.variables.add(obj = [Servers[j].cost for j in range(n)],
-                               lb = [0]*n,
-                               ub = [1]*n,
-                               types = ["B"]*n))
-    
-    # Rate of client's i demand fullfilled by server j, y_{i,j}
-    y = [[] for i in range(m)]
-    for i in range(m):
-        y[i] = list(flp.variables.add(obj = q[i],
-                                      lb = [0]*n,
-                                      ub = [1]*n))
+    ## With a solve_trace.Tracer, the phase timings and the progress of the
+    ## solver (incumbent, bound, gap, nodes) are written to its JSON lines trace
+    progress = None if trace is None else trace.progress
+
+    capacity = Servers.capacity
+    cost = Servers.cost
+    demand = Clients.demand
+    tol = Clients.tol
+    fulfil = fulfil_rule(demand, capacity)
     
+    ## Clients on the same node (and in the same tolerance class) are merged
+    ## into one client, and split back after the solve. Without tol_step only
+    ## equal tolerances are merged, so with the random tolerances of the "tol"
+    ## rule nothing is ; with it, a group takes the largest tolerance of its
+    ## clients and the answer is only feasible for them (no valid bound)
+    if aggregate :
+        agg = aggregate_clients(Clients.num, demand, tol if fulfil == "tol" else None, tol_step)
+        print(len(demand), "clients merged into", len(agg.node))
+        demand, tol, q = agg.demand, agg.tol, aggregate_rows(q, agg.group)
     
-    ## Create the constraints
+    ## Only the k cheapest servers of each client get a y_{i,j} column, the
+    ## other ones are priced back in from the LP duals, and the servers that
+    ## reduced costs cannot rule out get all their pairs back when the gap to
+    ## the root bound is not closed (see candidates.solve_pruned)
+    if k is not None :
+        result, mask = solve_pruned(capacity, cost, demand, q, candidate_mask(q, k = k),
+                                    "aggregated", fulfil, tol, backend, progress = progress,
+                                    time_limit = deadline, mip_gap = gap)
+        print(mask.sum(), "of", mask.size, "assignment variables used")
     
-    # Facility j cannot supply more than x_{j}*S_{j}: 
+    else :
+        ## Build the model arrays in one pass
+        start = time.time()
+        model = build_model(capacity = capacity,
+                            cost = cost,
+                            demand = demand,
+                            obj_y = q,
+                            formulation = "aggregated",
+                            fulfil = fulfil,
+                            tol = tol)
         
-    flp.linear_constraints.add(lin_expr = [[[y[i][j] for i in range(m)]+[x[j]],[Clients[i].demand for i in range(m)]+[-Servers[j].capacity]] for j in range(n)],
-                               senses = ["L"]*n,
-                               rhs = [0.0]*n
-                               )
-    
+        build = time.time()
+        if trace is not None :
+            trace.event("phase", name = "build", duration = build-start)
         
-    # Demands are fullfiled : if all demands can be fullfilled, they are, and if not then we insure that client's demand are satisfied with a certain tolerance
-    
-    if sum(Clients[i].demand for i in range(m)) <= sum(Servers[j].capacity for j in range(n)): 
-        flp.linear_constraints.add(lin_expr = [[y[i],[1.0]*n] for i in range(m)],
-                                    senses = ["E"]*m,                               
-                                    rhs = [1.0]*m)
-    
-    else :
-        flp.linear_constraints.add(lin_expr = [[y[i],[1.0]*n] for i in range(m)],
-                                senses = ["L"]*m,                               
-                                rhs = [1.0]*m)
-        flp.linear_constraints.add(lin_expr = [[y[i], [1.0]*n] for i in range(m)], 
-                               senses = ["G"]*m,
-                               rhs = [Clients[i].tol for i in range(m)])  
+        ## Solve the model with the chosen backend ("cplex" or "highs"), within
+        ## deadline seconds and to the relative gap if given (backend "anytime"
+        ## answers at once with a rounded solution and improves it until then),
+        ## or by Benders decomposition : x in the master, the flows in LP subproblems
         
-    ## Solve the model
+        if decompose :
+            result, history = solve_benders(model, backend = backend, time_limit = deadline, mip_gap = gap)
+            print(len(history), "Benders iterations, bounds:", [(h["lower"], h["upper"]) for h in history])
+            if trace is not None :
+                for h in history :
+                    trace.event("benders", **h)
+        else :
+            result = solve(model, backend = backend, time_limit = deadline, mip_gap = gap, progress = progress)
+        print("build time:", build-start, "solve time:", result.solve_time)
     
-    flp.solve()
-    return flp
+    if aggregate and result.values is not None :
+        result = result._replace(values = disaggregate(result.values, len(capacity), agg.group))
+    if aggregate and fulfil == "tol" and raised(agg, Clients.tol) :
+        result = result._replace(status = "feasible" if result.status == "optimal" else result.status, bound = None)
+    if trace is not None :
+        trace.result(result)
+    return result
 
 
 #-----------------------------------------------------------------------------
@@ -120,37 +117,22 @@ def facility_location_problem(Servers, Clients, q) :
 #-----------------------------------------------------------------------------
 
 start = time.time()
-flp = facility_location_problem(Servers, Clients, q)
+result = facility_location_problem(Servers, Clients, q)
 end = time.time()
 
 print("runtime:", end-start)
 
 
-x_sol = flp.solution.get_values()[:n]
-y_sol = np.array([flp.solution.get_values()[(i+1)*n:(i+2)*n] for i in range(m)])
-distr = np.array([y_sol[i]*Clients[i].demand for i in range(m)])
+sol = Solution.from_result(result, Clients.demand, Servers.capacity)
 
 
-print(distr)
+print(sol.distr)
 
 print(net)
-print(dist_matrix)
+print(q)
 print(Clients)
-print([Servers[j].cost for j in range(n)])
-print([Servers[j].capacity for j in range(n)])
+print(Servers.cost)
+print(Servers.capacity)
 
-for j in range(n):
-    if x_sol[j] == 0:
-        a=1
-   #     print("Server " + str(j+1) + " is shutdown")
-    else :
-        print("Server " + str(j+1) + " uses " + str(100*round(sum(distr[:,j])/Servers[j].capacity,3)) + "% of computing capacity")
-        for i in [i for i in range(m) if y_sol[i,j] > 0.0]:
-            a=2
-            # print("   - Client " + str(i+1) + " which has " + str(100*round(y_sol[i,j], 3)) + "% of its data treated by this server")
-print("\n"
-      + str(100*round(sum(sum(distr))/sum([Servers[j].capacity for j in range(n)]), 3))
-      + "% computing capacity used\n"
-      + str(100*round(sum(sum(distr))/sum([Clients[i].demand for i in range(m)]), 3))
-      + "% data treated"
-      + "\nTotal cost : " + str(round(flp.solution.get_objective_value(),2)))
\ No newline at end of file
+for line in sol.report(closed = False, clients = False) :
+    print(line)
\ No newline at end of file